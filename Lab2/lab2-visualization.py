@@ -1,11 +1,11 @@
-from mesa import Agent, Model
-from mesa.time import RandomActivation
-from mesa.space import MultiGrid
-import random
 import streamlit as st
 import numpy as np
+import queue
+import threading
 import time
 
+from lab2 import PreyPredatorModel
+
 
 # PyPi dependencies: 
 #     pip install streamlit
@@ -13,153 +13,120 @@ import time
 # bash command to run: streamlit run lab2-visualization.py
 
 
-PLACEHOLDER_POS = (0,0)
-class Prey(Agent):
-    def __init__(self, unique_id, model):
-        super().__init__(unique_id, model)
-        self.energy = 100
-
-    def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
-   
-    def eat(self):
-        self.energy += 10
-
-    def breed(self):
-        if self.energy >= 200:
-            self.energy -= 100
-            new_prey = Prey(self.model.next_id(), self.model)
-            self.model.grid.place_agent(new_prey, PLACEHOLDER_POS)
-            self.model.grid.move_to_empty(new_prey)
-            self.model.schedule.add(new_prey)
-
-    def step(self):
-        if self.pos is None:
-            return
-        self.move()
-        self.breed()
-        self.energy -= 1
-
-class Predator(Agent):
-    def __init__(self, unique_id, model):
-        super().__init__(unique_id, model)
-        self.energy = 100
-
-    def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
-
-    def eat(self):
-        prey_neighbors = self.model.grid.get_cell_list_contents(
-            [self.pos]
-        )
-        prey_agents = [agent for agent in prey_neighbors if isinstance(agent, Prey)]
-        if prey_agents:
-            prey_to_eat = random.choice(prey_agents)
-            self.model.grid.remove_agent(prey_to_eat)
-            self.model.schedule.remove(prey_to_eat)
-            self.energy += 100
-            
-    def breed(self):
-        if self.energy >= 200:
-            self.energy -= 100
-            new_predator = Predator(self.model.next_id(), self.model)
-            self.model.grid.place_agent(new_predator, PLACEHOLDER_POS)
-            self.model.grid.move_to_empty(new_predator)
-            self.model.schedule.add(new_predator)
-
-    def step(self):
-        if self.pos is None:
-            return
-        self.move()
-        self.eat()
-        self.breed()
-        self.energy -= 1
-
-class Poacher(Agent):
-    def __init__(self, unique_id, model):
-        super().__init__(unique_id, model)
-        self.energy = 50
-    
-    def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
-    
-    def poach(self):
-        if self.energy >= 5:
-            predator_neighbors = self.model.grid.get_cell_list_contents(
-                [self.pos]
-            )
-            predator_agents = [agent for agent in predator_neighbors if isinstance(agent, Predator)]
-            if predator_agents:
-                predator_to_poach = random.choice(predator_agents)
-                self.model.grid.remove_agent(predator_to_poach)
-                self.model.schedule.remove(predator_to_poach)
-                self.energy -= 5
-        
-    def step(self):
-        if self.pos is None:
-            return
-        self.move()
-        self.poach()
-        self.energy -= 1
-
-class PreyPredatorModel(Model):
-    def __init__(self, height, width, prey_count, predator_count, poacher_count):
-        super().__init__()
-        self.current_id = 0
-        self.height = height
-        self.width = width
-        self.grid = MultiGrid(height, width, torus=True)
-        self.schedule = RandomActivation(self)
-        self.running = True
-
-        for i in range(prey_count):
-            prey = Prey(self.next_id(), self)
-            self.grid.place_agent(prey, PLACEHOLDER_POS)
-            self.grid.move_to_empty(prey)
-            self.schedule.add(prey)
-
-        for i in range(predator_count):
-            predator = Predator(self.next_id(), self)
-            self.grid.place_agent(predator, PLACEHOLDER_POS)
-            self.grid.move_to_empty(predator)
-            self.schedule.add(predator)
-        
-        for i in range(poacher_count):   
-            poacher = Poacher(self.next_id(), self)
-            self.grid.place_agent(poacher, PLACEHOLDER_POS)
-            self.grid.move_to_empty(poacher)
-            self.schedule.add(poacher)
-
-    def step(self):
-        self.schedule.step()
-
-# Converts the grid into a 2D numpy array with emojis representing the agents. 
-def visualize_grid(grid, height, width):
-    arr = np.empty((height, width), dtype=np.object_)
-    for i in range(1, height + 1):
-        for j in range(1, width + 1):
+# Emoji and colour for each code in model.species_grid (0 is an empty cell).
+EMOJIS = np.array(['', '🐄', '🐅', '🔫'], dtype=np.object_)
+COLOURS = np.array([[255, 255, 255], [139, 90, 43], [255, 140, 0], [0, 0, 0]], dtype=np.uint8)
+# Grids wider or taller than this are drawn as an image instead of an emoji table.
+EMOJI_LIMIT = 25
+IMAGE_SIZE = 600
+
+
+# Orients the model's species codes the way the grid is displayed: cell
+# (i, j) is drawn at row height - i, column width - j, wrapping around the torus.
+def oriented_codes(species_grid):
+    return np.roll(species_grid[::-1, ::-1], 1, axis=(0, 1))
+
+
+# Converts the species codes into a 2D numpy array with emojis representing the agents.
+def visualize_grid(codes):
+    return EMOJIS[codes]
+
+
+# Converts the species codes into an RGB image, scaled up to about IMAGE_SIZE pixels.
+def render_image(codes):
+    scale = max(IMAGE_SIZE // max(codes.shape), 1)
+    return np.repeat(np.repeat(COLOURS[codes], scale, axis=0), scale, axis=1)
+
+
+def draw(placeholder, codes):
+    if max(codes.shape) <= EMOJI_LIMIT:
+        placeholder.dataframe(visualize_grid(codes))
+    else:
+        placeholder.image(render_image(codes), caption='Brown: prey, orange: predators, black: poachers')
+
+
+# Runs a model on a background thread, publishing (step, frame, counts) to a
+# bounded queue that the page drains at its own refresh rate. When the queue is
+# full the oldest frame is dropped, so a slow page never holds the model back.
+class SimulationWorker(threading.Thread):
+    def __init__(self, model, step_count, step_time, queue_size=8):
+        super().__init__(daemon=True)
+        self.model = model
+        self.step_count = step_count
+        self.step_time = step_time
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.playing = True
+        self.pending = 0
+        self.stepping = False
+        self.fast_forward = False
+
+    def publish(self):
+        frame = (self.model.schedule.steps, oriented_codes(self.model.species_grid), {
+            'Prey Count': self.model.prey_count,
+            'Predator Count': self.model.predator_count,
+            'Poacher Count': self.model.poacher_count,
+        })
+        while True:
             try:
-                if isinstance(grid[i, j][0], Prey):
-                    arr[height - i, width - j] = '🐄'
-                elif isinstance(grid[i, j][0], Predator):
-                    arr[height - i, width - j] = '🐅'
-                elif isinstance(grid[i, j][0], Poacher):
-                    arr[height - i, width - j] = '🔫'
-            except IndexError:
-                arr[height - i, width - j] = ''
-    return arr
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        self.publish()
+        while self.model.schedule.steps < self.step_count and not self.stopped.is_set():
+            with self.lock:
+                advance = self.playing or self.pending > 0
+                if not self.playing and self.pending > 0:
+                    self.pending -= 1
+                self.stepping = advance
+            if not advance:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+
+            self.model.step()
+            self.publish()
+            with self.lock:
+                self.stepping = False
+            if self.playing and not self.fast_forward:
+                time.sleep(self.step_time)
+
+    # True once the worker will publish no more frames until a control is
+    # used: it finished, or it is paused with no steps left to advance.
+    def idle(self):
+        with self.lock:
+            return not self.is_alive() or not (self.playing or self.pending > 0 or self.stepping)
+
+    def pause(self):
+        with self.lock:
+            self.playing = False
+
+    # Steps still pending from Step N are dropped, so they do not run at the next pause.
+    def resume(self):
+        with self.lock:
+            self.playing = True
+            self.pending = 0
+        self.wake.set()
+
+    # Advances `n` steps while paused; ignored while playing.
+    def step_n(self, n):
+        with self.lock:
+            if self.playing:
+                return
+            self.pending += n
+        self.wake.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
 
 
 def main():
@@ -169,44 +136,66 @@ def main():
     # uses a form + number_input to retrieve model params from the user
     with st.form('Input Parameters'):
         cols = st.columns(4)
-        height = cols[0].number_input('Height', min_value=0, max_value=25, value=5)
-        width = cols[1].number_input('Width', min_value=0, max_value=25, value=5)
+        height = cols[0].number_input('Height', min_value=0, max_value=200, value=5)
+        width = cols[1].number_input('Width', min_value=0, max_value=200, value=5)
         prey = cols[2].number_input('Prey', min_value=0, max_value=(height * width), value=10)
         predators = cols[3].number_input('Predators', min_value=0, max_value=(height * width ), value=2)
         poachers = cols[0].number_input('Poachers', min_value=0, max_value=(height * width), value=1)
         step_count = cols[1].number_input('Steps', min_value=0, value=10) 
         step_time = cols[2].number_input('Step time', min_value=0.0, max_value=10.0, value=0.5, step=0.5)
+        refresh_rate = cols[3].number_input('Refresh rate (fps)', min_value=1, max_value=60, value=10)
 
         submit = st.form_submit_button('Submit')
 
-    # Check if form has been submitted
+    # Start a new worker for the submitted parameters. The worker lives in the
+    # session state, so it keeps running across reruns caused by the controls.
     if submit:
-        # Create the model
+        if 'worker' in st.session_state:
+            st.session_state.worker.stop()
         model = PreyPredatorModel(height=height, width=width, prey_count=prey, predator_count=predators, poacher_count=poachers)
-        # Dispaly the model grid as a dataframe
-        agent_grid = st.dataframe(visualize_grid(model.grid, height, width))
-        
-        # Display the counts as a dataframe
-        counts = st.dataframe({'Step': 0, 'Prey Count': prey, 'Predators Count': predators, 'Poacher Count': poachers})
-
-        # Step through the model `step_count` times
-        steps = 0
-        while steps < step_count:
-            time.sleep(step_time)
-            model.step()
-            # Update the agent_grid dataframe
-            agent_grid.dataframe(visualize_grid(model.grid, model.height, model.width))
-
-            # Calculate the counts
-            prey_count=sum(isinstance(agent, Prey) for agent in model.schedule.agents)
-            predator_count = sum(isinstance(agent, Predator) for agent in model.schedule.agents)
-            poacher_count = sum(isinstance(agent, Poacher) for agent in model.schedule.agents)
-
-            # Update the counts dataframe 
-            counts.dataframe({'Step': steps, 'Prey Count': prey_count, 'Predator Count': predator_count, 'Poacher': poacher_count})
-            
-            # Increment the step counter
-            steps += 1
+        st.session_state.worker = SimulationWorker(model, step_count, step_time)
+        st.session_state.worker.start()
+        st.session_state.frame = None
+        st.session_state.refresh_rate = refresh_rate
+
+    if 'worker' not in st.session_state:
+        return
+    worker = st.session_state.worker
+
+    # Playback controls
+    controls = st.columns(4)
+    if controls[0].button('Pause'):
+        worker.pause()
+    if controls[1].button('Resume'):
+        worker.resume()
+    n = controls[2].number_input('Steps to advance', min_value=1, value=1)
+    if controls[3].button('Step N'):
+        worker.step_n(n)
+    worker.fast_forward = st.checkbox('Fast-forward', value=worker.fast_forward)
+
+    # Display the model grid, as a dataframe for small grids and an image for large ones
+    agent_grid = st.empty()
+    counts = st.empty()
+    frame = st.session_state.frame
+    if frame is not None:
+        draw(agent_grid, frame[1])
+        counts.dataframe({'Step': frame[0], **frame[2]})
+
+    # Drain the queue at the refresh rate, drawing only the latest frame and
+    # only if a cell changed since the one on screen. The run ends once the
+    # worker is idle: streamlit 1.23 only handles a rerun (a control being
+    # used) when the script draws something, so it must not wait for frames
+    # that a paused worker will never send.
+    while not worker.idle() or not worker.frames.empty():
+        latest = None
+        while not worker.frames.empty():
+            latest = worker.frames.get_nowait()
+        if latest is not None:
+            if frame is None or (latest[1] != frame[1]).any():
+                draw(agent_grid, latest[1])
+            counts.dataframe({'Step': latest[0], **latest[2]})
+            frame = st.session_state.frame = latest
+        time.sleep(1 / st.session_state.refresh_rate)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -1,22 +1,43 @@
-from mesa import Agent, Model
+from mesa import Model
 from mesa.time import RandomActivation
 from mesa.space import MultiGrid
-import random
+from array import array
+import hashlib
+import json
+import struct
+import numpy as np
+
+# Moore neighbourhood offsets, in the same order as MultiGrid.get_neighborhood.
+MOORE_OFFSETS = np.array(
+    [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy], dtype=np.int32)
+
+# Base of the three agent types, with the interface Mesa's Agent gives them.
+# All attributes live in __slots__, so instances carry no __dict__; Mesa's Agent
+# has no slots, so subclasses of it always get one.
+class Animal:
+    __slots__ = ('unique_id', 'model', 'pos', 'energy', '__weakref__')
+
+    def __init__(self, unique_id, model):
+        self.unique_id = unique_id
+        self.model = model
+        self.pos = None
+
+    @property
+    def random(self):
+        return self.model.random
 
-PLACEHOLDER_POS = (0, 0)
 
 # Prey Agent. Moves Randomly.
-class Prey(Agent):
+class Prey(Animal):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.energy = 100
 
     def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
+        new_position = self.model.random_neighbour(self.pos)
+        self.model.move_agent(self, new_position)
 
     def eat(self):
         self.energy += 10
@@ -24,10 +45,7 @@ class Prey(Agent):
     def breed(self):
         if self.energy >= 200:
             self.energy -= 100
-            new_prey = Prey(self.model.next_id(), self.model)
-            self.model.grid.place_agent(new_prey, PLACEHOLDER_POS)
-            self.model.grid.move_to_empty(new_prey)
-            self.model.schedule.add(new_prey)
+            self.model.spawn(self.model.new_agent(Prey))
 
     def step(self):
         if self.pos is None:
@@ -37,17 +55,16 @@ class Prey(Agent):
         self.energy -= 1
 
 # Predator Agent. Moves Randomly. Eats Prey.
-class Predator(Agent):
+class Predator(Animal):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.energy = 100
 
     def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
+        new_position = self.model.random_neighbour(self.pos)
+        self.model.move_agent(self, new_position)
 
     def eat(self):
         prey_neighbors = self.model.grid.get_cell_list_contents(
@@ -56,18 +73,15 @@ class Predator(Agent):
         prey_agents = [
             agent for agent in prey_neighbors if isinstance(agent, Prey)]
         if prey_agents:
-            prey_to_eat = random.choice(prey_agents)
-            self.model.grid.remove_agent(prey_to_eat)
-            self.model.schedule.remove(prey_to_eat)
+            prey_to_eat = self.random.choice(prey_agents)
+            self.model.despawn(prey_to_eat)
+            self.model.deaths += 1
             self.energy += 100
 
     def breed(self):
         if self.energy >= 200:
             self.energy -= 100
-            new_predator = Predator(self.model.next_id(), self.model)
-            self.model.grid.place_agent(new_predator, PLACEHOLDER_POS)
-            self.model.grid.move_to_empty(new_predator)
-            self.model.schedule.add(new_predator)
+            self.model.spawn(self.model.new_agent(Predator))
 
     def step(self):
         if self.pos is None:
@@ -78,17 +92,16 @@ class Predator(Agent):
         self.energy -= 1
 
 # Poacher Agent. Moves randomly. Kills predators.
-class Poacher(Agent):
+class Poacher(Animal):
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         super().__init__(unique_id, model)
         self.energy = 50
 
     def move(self):
-        possible_steps = self.model.grid.get_neighborhood(
-            self.pos, moore=True, include_center=False
-        )
-        new_position = random.choice(possible_steps)
-        self.model.grid.move_agent(self, new_position)
+        new_position = self.model.random_neighbour(self.pos)
+        self.model.move_agent(self, new_position)
 
     def poach(self):
         if self.energy >= 5:
@@ -98,9 +111,9 @@ class Poacher(Agent):
             predator_agents = [
                 agent for agent in predator_neighbors if isinstance(agent, Predator)]
             if predator_agents:
-                predator_to_poach = random.choice(predator_agents)
-                self.model.grid.remove_agent(predator_to_poach)
-                self.model.schedule.remove(predator_to_poach)
+                predator_to_poach = self.random.choice(predator_agents)
+                self.model.despawn(predator_to_poach)
+                self.model.kills += 1
                 self.energy -= 5
 
     def step(self):
@@ -111,36 +124,330 @@ class Poacher(Agent):
         self.energy -= 1
 
 
+SPECIES_CODES = {Prey: 0, Predator: 1, Poacher: 2}
+SPECIES = (Prey, Predator, Poacher)
+
+# Snapshot file layout: magic, header length, JSON header, then one fixed-size
+# record per agent starting at a 64-byte aligned offset so it can be memory-mapped.
+# Agents are stored in schedule order, with their slot in the cell's agent list.
+SNAPSHOT_MAGIC = b'PPSNAP2\n'
+SNAPSHOT_DTYPE = np.dtype([
+    ('id', '<i8'), ('species', 'i1'), ('x', '<i4'), ('y', '<i4'), ('energy', '<i4'), ('slot', '<i4')])
+
+
+def _snapshot_offset(header_size):
+    return -(-(len(SNAPSHOT_MAGIC) + 8 + header_size) // 64) * 64
+
+
+# Compact log of the moves, births and deaths of a run. Each event is six ints
+# in a flat array: step, kind, agent id, species code and the cell (x, y).
+# Births during setup are logged as step 0.
+class EventLog:
+    MOVE, BIRTH, DEATH = 0, 1, 2
+
+    def __init__(self):
+        self.events = array('i')
+        self.step = 0
+
+    def log(self, kind, agent, pos):
+        self.events.extend((self.step, kind, agent.unique_id, SPECIES_CODES[type(agent)], *pos))
+
+    # Replays the run, yielding (step, agents) once each step is complete.
+    # `agents` maps agent id to (species code, (x, y)) and is updated in place.
+    def replay(self):
+        agents = {}
+        current = 0
+        for i in range(0, len(self.events), 6):
+            step, kind, unique_id, species, x, y = self.events[i:i + 6]
+            if step != current:
+                yield current, agents
+                current = step
+            if kind == self.DEATH:
+                del agents[unique_id]
+            else:
+                agents[unique_id] = (species, (x, y))
+        yield current, agents
+
+    # Hash of the whole log, to compare or cache runs.
+    def fingerprint(self):
+        return hashlib.sha256(self.events.tobytes()).hexdigest()
+
+
+# Set of empty grid cells, numbered x * grid.height + y. The first `size`
+# entries of `cells` are the empty cells and `slots` maps each cell to its
+# entry, so adding, removing and picking a random cell are all O(1).
+class EmptyCellIndex:
+    def __init__(self, n_cells):
+        self.cells = array('q', range(n_cells))
+        self.slots = array('q', range(n_cells))
+        self.size = n_cells
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, cell):
+        return self.slots[cell] < self.size
+
+    def _swap(self, i, j):
+        a, b = self.cells[i], self.cells[j]
+        self.cells[i], self.cells[j] = b, a
+        self.slots[a], self.slots[b] = j, i
+
+    def add(self, cell):
+        if self.slots[cell] >= self.size:
+            self._swap(self.slots[cell], self.size)
+            self.size += 1
+
+    def remove(self, cell):
+        if self.slots[cell] < self.size:
+            self.size -= 1
+            self._swap(self.slots[cell], self.size)
+
+    def choice(self, rng):
+        return self.cells[rng.randrange(self.size)]
+
+    # Puts the cells back in a saved order, the empty ones being the first `size`.
+    # choice() and later adds depend on this order, not just on which cells are empty.
+    def restore(self, cells, size):
+        self.cells = array('q', cells)
+        for slot, cell in enumerate(cells):
+            self.slots[cell] = slot
+        self.size = size
+
+
+# Flat table of the Moore neighbours of every cell of a torus grid, with cells
+# numbered x * height + y. The neighbours of cell c are entries
+# starts[c]:starts[c + 1]. On a grid under 3 cells wide or high, offsets wrap
+# onto the same cell; like get_neighborhood, such a cell is listed once and a
+# cell is never its own neighbour, so those cells have fewer than 8.
+def moore_neighbour_table(width, height):
+    x, y = np.divmod(np.arange(width * height, dtype=np.int32), np.int32(height))
+    nx = (x[:, None] + MOORE_OFFSETS[:, 0]) % width
+    ny = (y[:, None] + MOORE_OFFSETS[:, 1]) % height
+    cells = (nx * height + ny).astype(np.int32)
+    if width >= 3 and height >= 3:
+        starts = np.arange(0, cells.size + 1, 8, dtype=np.int32)
+        return array('i', cells.tobytes()), array('i', starts.tobytes())
+    table, starts = array('i'), array('i', [0])
+    for cell, row in enumerate(cells.tolist()):
+        table.extend(dict.fromkeys(neighbour for neighbour in row if neighbour != cell))
+        starts.append(len(table))
+    return table, starts
+
+
+# Per-step population time series backed by a preallocated array. Deaths are
+# prey eaten by predators, kills are predators shot by poachers.
+class PopulationRecorder:
+    COLUMNS = ('prey', 'predators', 'poachers', 'births', 'deaths', 'kills')
+
+    def __init__(self, max_steps):
+        self.data = np.zeros((max_steps, len(self.COLUMNS)), dtype=np.int64)
+        self.length = 0
+
+    def record(self, model):
+        if self.length == len(self.data):
+            self.data = np.resize(self.data, (2 * len(self.data) + 1, len(self.COLUMNS)))
+        self.data[self.length] = (
+            model.prey_count, model.predator_count, model.poacher_count,
+            model.births, model.deaths, model.kills)
+        self.length += 1
+
+    def __getitem__(self, column):
+        return self.data[:self.length, self.COLUMNS.index(column)]
+
+
 class PreyPredatorModel(Model):
-    def __init__(self, height, width, prey_count, predator_count, poacher_count):
+    def __init__(self, height, width, prey_count, predator_count, poacher_count, recorder=None, seed=None, event_log=None):
         super().__init__()
+        # All agents draw from self.random, so models do not share random state.
+        self.reset_randomizer(seed)
         self.current_id = 0
         self.height = height
         self.width = width
         self.grid = MultiGrid(height, width, torus=True)
+        self.empty_cells = EmptyCellIndex(height * width)
+        self.neighbours, self.neighbour_starts = moore_neighbour_table(self.grid.width, self.grid.height)
+        # Species code (SPECIES_CODES + 1, 0 for empty) of the first agent in each cell.
+        self.species_grid = np.zeros((self.grid.width, self.grid.height), dtype=np.int8)
         self.schedule = RandomActivation(self)
         self.running = True
+        self.recorder = recorder
+        self.event_log = event_log
+
+        # Live population per agent type, plus births/deaths/kills of the current step.
+        self.counts = {Prey: 0, Predator: 0, Poacher: 0}
+        self.births = self.deaths = self.kills = 0
+        # Free lists of dead agents per type, reused for newborns. Agents that
+        # die during a step wait in _dead until it ends, since the schedule may
+        # still visit them in that step.
+        self._pool = {Prey: [], Predator: [], Poacher: []}
+        self._dead = []
 
         for i in range(prey_count):
-            prey = Prey(self.next_id(), self)
-            self.grid.place_agent(prey, PLACEHOLDER_POS)
-            self.grid.move_to_empty(prey)
-            self.schedule.add(prey)
+            self.spawn(self.new_agent(Prey))
 
         for i in range(predator_count):
-            predator = Predator(self.next_id(), self)
-            self.grid.place_agent(predator, PLACEHOLDER_POS)
-            self.grid.move_to_empty(predator)
-            self.schedule.add(predator)
+            self.spawn(self.new_agent(Predator))
 
         for i in range(poacher_count):
-            poacher = Poacher(self.next_id(), self)
-            self.grid.place_agent(poacher, PLACEHOLDER_POS)
-            self.grid.move_to_empty(poacher)
-            self.schedule.add(poacher)
+            self.spawn(self.new_agent(Poacher))
+
+    @property
+    def prey_count(self):
+        return self.counts[Prey]
+
+    @property
+    def predator_count(self):
+        return self.counts[Predator]
+
+    @property
+    def poacher_count(self):
+        return self.counts[Poacher]
+
+    def _cell(self, pos):
+        x, y = pos
+        return x * self.grid.height + y
+
+    def _refresh_cell(self, pos):
+        contents = self.grid[pos]
+        self.species_grid[pos] = SPECIES_CODES[type(contents[0])] + 1 if contents else 0
+
+    # Same draw as random.choice over get_neighborhood, read from the table.
+    def random_neighbour(self, pos):
+        cell = self._cell(pos)
+        start = self.neighbour_starts[cell]
+        cell = self.neighbours[start + self.random.randrange(self.neighbour_starts[cell + 1] - start)]
+        return divmod(cell, self.grid.height)
+
+    # Returns a fresh agent of type `cls`, recycled from the free list if possible.
+    def new_agent(self, cls):
+        pool = self._pool[cls]
+        if pool:
+            agent = pool.pop()
+            agent.__init__(self.next_id(), self)
+            return agent
+        return cls(self.next_id(), self)
+
+    # Places a new agent in a random empty cell and schedules it.
+    def spawn(self, agent):
+        if not self.empty_cells:
+            raise Exception('ERROR: No empty cells')
+        cell = self.empty_cells.choice(self.random)
+        self.empty_cells.remove(cell)
+        self.grid.place_agent(agent, divmod(cell, self.grid.height))
+        self._refresh_cell(agent.pos)
+        self.schedule.add(agent)
+        self.counts[type(agent)] += 1
+        self.births += 1
+        if self.event_log is not None:
+            self.event_log.log(EventLog.BIRTH, agent, agent.pos)
+
+    # Takes an agent off the grid and the schedule.
+    def despawn(self, agent):
+        if self.event_log is not None:
+            self.event_log.log(EventLog.DEATH, agent, agent.pos)
+        pos = agent.pos
+        self.grid.remove_agent(agent)
+        self._refresh_cell(pos)
+        if self.grid.is_cell_empty(pos):
+            self.empty_cells.add(self._cell(pos))
+        self.schedule.remove(agent)
+        self.counts[type(agent)] -= 1
+        self._dead.append(agent)
+
+    # Writes the grid, every agent, the id counter, the RNG state and the order
+    # of the empty-cell index to `path`.
+    def save_snapshot(self, path):
+        agents = list(self.schedule.agents)
+        records = np.empty(len(agents), dtype=SNAPSHOT_DTYPE)
+        for i, agent in enumerate(agents):
+            x, y = agent.pos
+            records[i] = (agent.unique_id, SPECIES_CODES[type(agent)], x, y,
+                          agent.energy, self.grid[x, y].index(agent))
+
+        version, state, gauss_next = self.random.getstate()
+        header = json.dumps({
+            'height': self.height,
+            'width': self.width,
+            'current_id': self.current_id,
+            'steps': self.schedule.steps,
+            'time': self.schedule.time,
+            'seed': self._seed,
+            'random_state': [version, state, gauss_next],
+            'agents': len(records),
+            'empty_cells': len(self.empty_cells),
+        }).encode()
+        offset = _snapshot_offset(len(header))
+        with open(path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(bytes(offset - f.tell()))
+            f.write(records.tobytes())
+            f.write(np.asarray(self.empty_cells.cells, dtype='<i8').tobytes())
+
+    # Rebuilds a model from a file written by save_snapshot. The agent records
+    # are memory-mapped rather than read into memory.
+    @classmethod
+    def load_snapshot(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f'{path} is not a model snapshot')
+            (header_size,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_size))
+        offset = _snapshot_offset(header_size)
+        if header['agents']:
+            records = np.memmap(path, dtype=SNAPSHOT_DTYPE, mode='r', offset=offset, shape=(header['agents'],))
+        else:
+            records = np.empty(0, dtype=SNAPSHOT_DTYPE)
+        cells = np.fromfile(path, dtype='<i8', count=header['height'] * header['width'],
+                            offset=offset + header['agents'] * SNAPSHOT_DTYPE.itemsize)
+
+        model = cls(header['height'], header['width'], 0, 0, 0, seed=header['seed'])
+        model.current_id = header['current_id']
+        model.schedule.steps = header['steps']
+        model.schedule.time = header['time']
+        version, state, gauss_next = header['random_state']
+        model.random.setstate((version, tuple(state), gauss_next))
+
+        agents = []
+        for unique_id, species, x, y, energy, slot in records.tolist():
+            agent = SPECIES[species](unique_id, model)
+            agent.energy = energy
+            agents.append(agent)
+            model.counts[type(agent)] += 1
+        # Cell contents are rebuilt in their saved order, then the schedule in its own.
+        for i in np.lexsort((records['slot'], records['y'], records['x'])).tolist():
+            pos = (int(records['x'][i]), int(records['y'][i]))
+            model.grid.place_agent(agents[i], pos)
+            model._refresh_cell(pos)
+            model.empty_cells.remove(model._cell(pos))
+        for agent in agents:
+            model.schedule.add(agent)
+        model.empty_cells.restore(cells.tolist(), header['empty_cells'])
+        return model
+
+    def move_agent(self, agent, pos):
+        old_pos = agent.pos
+        self.grid.move_agent(agent, pos)
+        self._refresh_cell(old_pos)
+        self._refresh_cell(pos)
+        if self.grid.is_cell_empty(old_pos):
+            self.empty_cells.add(self._cell(old_pos))
+        self.empty_cells.remove(self._cell(pos))
+        if self.event_log is not None:
+            self.event_log.log(EventLog.MOVE, agent, pos)
 
     def step(self):
+        self.births = self.deaths = self.kills = 0
+        if self.event_log is not None:
+            self.event_log.step += 1
         self.schedule.step()
+        for agent in self._dead:
+            self._pool[type(agent)].append(agent)
+        self._dead.clear()
+        if self.recorder is not None:
+            self.recorder.record(self)
 
 
 def main():
@@ -151,14 +458,8 @@ def main():
 
     while steps < step_count:
         model.step()
-        prey_count = sum(isinstance(agent, Prey)
-                         for agent in model.schedule.agents)
-        predator_count = sum(isinstance(agent, Predator)
-                             for agent in model.schedule.agents)
-        poacher_count = sum(isinstance(agent, Poacher)
-                            for agent in model.schedule.agents)
         print(
-            f'Prey Count: {prey_count}, Predator Count: {predator_count}, Poacher Count: {poacher_count}')
+            f'Prey Count: {model.prey_count}, Predator Count: {model.predator_count}, Poacher Count: {model.poacher_count}')
         steps += 1
 
 
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from lab2 import Prey, Predator, Poacher, PreyPredatorModel
+from lab2_vectorized import VectorizedPreyPredatorModel
+
+# bash command to run, e.g.:
+#     python lab2_benchmark.py --sizes 50 100 200 --densities 0.1 0.5 --steps 20 --out bench.json
+
+ENGINES = {
+    'agent': PreyPredatorModel,
+    'vectorized': VectorizedPreyPredatorModel,
+}
+
+# Methods timed for each phase of a step. Time not spent in any of them
+# (scheduling, activation order, compaction) is reported as bookkeeping.
+PHASES = {
+    'agent': {
+        'move': [(Prey, 'move'), (Predator, 'move'), (Poacher, 'move')],
+        'eat/poach': [(Predator, 'eat'), (Poacher, 'poach')],
+        'breed': [(Prey, 'breed'), (Predator, 'breed')],
+    },
+    'vectorized': {
+        'move': [(VectorizedPreyPredatorModel, '_move')],
+        'eat/poach': [(VectorizedPreyPredatorModel, '_eat'), (VectorizedPreyPredatorModel, '_poach')],
+        'breed': [(VectorizedPreyPredatorModel, '_breed')],
+    },
+}
+
+# Population split used by main() in lab2.py: 20 prey, 7 predators, 3 poachers.
+SPECIES_SHARES = (20 / 30, 7 / 30, 3 / 30)
+
+
+# Wraps the phase methods of `engine` with timers for the duration of the
+# block, adding the seconds spent in each phase to the yielded dict.
+@contextmanager
+def timed_phases(engine):
+    totals = {phase: 0.0 for phase in PHASES[engine]}
+    originals = []
+
+    def timed(method, phase):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                totals[phase] += time.perf_counter() - start
+        return wrapper
+
+    for phase, methods in PHASES[engine].items():
+        for cls, name in methods:
+            method = cls.__dict__[name]
+            originals.append((cls, name, method))
+            setattr(cls, name, timed(method, phase))
+    try:
+        yield totals
+    finally:
+        for cls, name, method in originals:
+            setattr(cls, name, method)
+
+
+def population(model):
+    return model.prey_count + model.predator_count + model.poacher_count
+
+
+def make_model(engine, size, density, seed):
+    counts = [int(size * size * density * share) for share in SPECIES_SHARES]
+    return ENGINES[engine](size, size, *counts, seed=seed)
+
+
+# Memory the agents of a freshly built model take, per agent: traced memory of
+# the populated model minus that of an empty one of the same size.
+def memory_per_agent(engine, size, density, seed=0):
+    tracemalloc.start()
+    empty = make_model(engine, size, 0, seed)
+    empty_bytes = tracemalloc.get_traced_memory()[0]
+    del empty
+    model = make_model(engine, size, density, seed)
+    model_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (model_bytes - empty_bytes) / max(population(model), 1)
+
+
+# Runs `steps` steps and returns (seconds, agent updates).
+def run_steps(model, steps):
+    updates = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        updates += population(model)
+        model.step()
+    return time.perf_counter() - start, updates
+
+
+def benchmark(engine, size, density, steps, seed=0):
+    # Throughput, without any instrumentation.
+    model = make_model(engine, size, density, seed)
+    agents = population(model)
+    seconds, updates = run_steps(model, steps)
+
+    # Peak memory of building and running the same model.
+    tracemalloc.start()
+    run_steps(make_model(engine, size, density, seed), steps)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Phase breakdown, on a third identical run.
+    model = make_model(engine, size, density, seed)
+    with timed_phases(engine) as phases:
+        profiled_seconds, _ = run_steps(model, steps)
+    phases['bookkeeping'] = max(profiled_seconds - sum(phases.values()), 0.0)
+
+    bytes_per_agent = memory_per_agent(engine, size, density, seed)
+
+    return {
+        'engine': engine,
+        'size': size,
+        'density': density,
+        'agents': agents,
+        'steps': steps,
+        'seconds': seconds,
+        'steps_per_sec': steps / seconds,
+        'agent_updates_per_sec': updates / seconds,
+        'peak_memory_bytes': peak_memory,
+        'bytes_per_agent': bytes_per_agent,
+        'phase_seconds': phases,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark PreyPredatorModel.step()')
+    parser.add_argument('--engine', nargs='+', choices=sorted(ENGINES), default=['agent'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 50, 100])
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.1, 0.3, 0.6])
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark.json')
+    args = parser.parse_args()
+
+    results = []
+    for engine in args.engine:
+        for size in args.sizes:
+            for density in args.densities:
+                result = benchmark(engine, size, density, args.steps, args.seed)
+                results.append(result)
+                phases = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in result['phase_seconds'].items())
+                print(
+                    f"{engine} {size}x{size} density {density}: {result['steps_per_sec']:.2f} steps/s, "
+                    f"{result['agent_updates_per_sec']:.0f} agent updates/s, "
+                    f"peak {result['peak_memory_bytes'] / 2**20:.1f} MiB, "
+                    f"{result['bytes_per_agent']:.0f} bytes/agent ({phases})")
+
+    with open(args.out, 'w') as f:
+        json.dump({
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import csv
+import itertools
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lab2 import PreyPredatorModel
+
+# bash command to run, e.g.:
+#     python lab2_sweep.py --height 10 20 --width 10 20 --prey 20 40 --replicates 5 --out sweep.csv
+# Re-running the same command resumes the sweep, skipping runs already in the output file.
+
+PARAMS = ('height', 'width', 'prey_count', 'predator_count', 'poacher_count')
+COLUMNS = PARAMS + ('seed', 'steps', 'prey', 'predators', 'poachers', 'collapse_step')
+
+
+# Derives a run's seed from the sweep seed, its parameters and its replicate
+# number, so a run gets the same seed no matter which worker picks it up.
+def run_seed(base_seed, params, replicate):
+    return zlib.crc32(repr((base_seed, params, replicate)).encode())
+
+
+# Runs one model for `steps` steps and returns its output row. collapse_step is
+# the first step where prey or predators died out, or -1 if neither did.
+def run(params, seed, steps):
+    model = PreyPredatorModel(*params, seed=seed)
+    collapse_step = -1
+    for step in range(1, steps + 1):
+        model.step()
+        if collapse_step < 0 and (model.prey_count == 0 or model.predator_count == 0):
+            collapse_step = step
+    return params + (seed, steps, model.prey_count, model.predator_count, model.poacher_count, collapse_step)
+
+
+# Reads the (params, seed, steps) keys of the runs already written to `path`.
+def completed_runs(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {
+            tuple(int(row[column]) for column in PARAMS + ('seed', 'steps'))
+            for row in csv.DictReader(f)
+        }
+
+
+def sweep(grid, replicates, steps, out, base_seed=0, workers=None):
+    done = completed_runs(out)
+    runs = [
+        (params, run_seed(base_seed, params, replicate))
+        for params in itertools.product(*grid)
+        for replicate in range(replicates)
+    ]
+    runs = [(params, seed) for params, seed in runs if params + (seed, steps) not in done]
+
+    new_file = not os.path.exists(out)
+    with open(out, 'a', newline='') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(COLUMNS)
+        futures = {pool.submit(run, params, seed, steps): (params, seed) for params, seed in runs}
+        # Rows are written as runs finish, so an interrupted sweep keeps its progress.
+        # A run that fails (e.g. more agents than cells) is reported and skipped.
+        finished = 0
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as error:
+                params, seed = futures[future]
+                print(f'Run {dict(zip(PARAMS, params))} with seed {seed} failed: {error}')
+                continue
+            writer.writerow(row)
+            f.flush()
+            finished += 1
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parameter sweep for PreyPredatorModel')
+    parser.add_argument('--height', type=int, nargs='+', default=[10])
+    parser.add_argument('--width', type=int, nargs='+', default=[10])
+    parser.add_argument('--prey', type=int, nargs='+', default=[20])
+    parser.add_argument('--predators', type=int, nargs='+', default=[7])
+    parser.add_argument('--poachers', type=int, nargs='+', default=[3])
+    parser.add_argument('--replicates', type=int, default=1)
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args()
+
+    grid = (args.height, args.width, args.prey, args.predators, args.poachers)
+    count = sweep(grid, args.replicates, args.steps, args.out, args.seed, args.workers)
+    print(f'Finished {count} runs, results in {args.out}')
+
+
+if __name__ == '__main__':
+    main()
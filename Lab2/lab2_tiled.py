@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from lab2_vectorized import VectorizedPreyPredatorModel
+
+# Agents only ever interact with agents in their own cell, and move at most one
+# row per step. So the only state tiles have to exchange is the agents that
+# step over a tile edge: after moving, each tile hands those agents to the
+# neighbouring tile, and the rest of the step runs on every tile independently.
+
+
+# One horizontal strip of the torus, rows x0 to x0 + rows - 1, run by its own process.
+class Tile(VectorizedPreyPredatorModel):
+    def __init__(self, height, width, x0, rows, agents, seed):
+        self.height = height
+        self.width = width
+        self.rng = np.random.default_rng(seed)
+        self.running = True
+        self.steps = 0
+        self.x0 = x0
+        self.rows = rows
+        self.x, self.y, self.species, self.energy = agents
+        self.alive = np.ones(self.x.size, dtype=bool)
+        self.counts = np.bincount(self.species, minlength=3)
+
+    def _agents(self, mask):
+        return self.x[mask], self.y[mask], self.species[mask], self.energy[mask]
+
+    # Sends agents that left the tile to the neighbouring tiles and takes in
+    # the ones that arrived. Each link is sent on by its own thread: a send
+    # larger than the pipe buffer blocks until the neighbour reads it, and a
+    # single thread sending on both links in turn can leave every tile of the
+    # ring waiting on the next one.
+    def _migrate(self, prev_link, next_link):
+        up = self.x == (self.x0 - 1) % self.height
+        down = self.x == (self.x0 + self.rows) % self.height
+        senders = [threading.Thread(target=link.send, args=(self._agents(mask),))
+                   for link, mask in ((prev_link, up), (next_link, down))]
+        self.alive[up | down] = False
+
+        for sender in senders:
+            sender.start()
+        incoming = [np.concatenate(arrays) for arrays in zip(prev_link.recv(), next_link.recv())]
+        for sender in senders:
+            sender.join()
+        self._compact(incoming)
+
+
+def _run_tile(tile, index, commands, prev_link, next_link, counts_name, n_tiles):
+    shared = SharedMemory(name=counts_name)
+    counts = np.ndarray((n_tiles, 3), dtype=np.int64, buffer=shared.buf)
+    try:
+        while commands.recv() == 'step':
+            tile._move()
+            if n_tiles > 1:
+                tile._migrate(prev_link, next_link)
+            tile._settle()
+            counts[index] = tile.counts
+            commands.send(None)
+    finally:
+        del counts
+        shared.close()
+
+
+# Runs the vectorized model split into horizontal tiles, one worker process per
+# tile. Tiles publish their population counts through shared memory. Newborns
+# are placed in a random empty cell of their parent's tile rather than of the
+# whole grid; everything else matches VectorizedPreyPredatorModel.
+class TiledPreyPredatorModel:
+    def __init__(self, height, width, prey_count, predator_count, poacher_count, seed=None, tiles=None):
+        self.height = height
+        self.width = width
+        self.running = True
+        self.steps = 0
+        # Every tile needs at least two rows, so its upper and lower neighbours are different rows.
+        n_tiles = max(min(tiles or os.cpu_count(), height // 2), 1)
+        self.n_tiles = n_tiles
+
+        seeds = np.random.SeedSequence(seed).spawn(n_tiles + 1)
+        start = VectorizedPreyPredatorModel(
+            height, width, prey_count, predator_count, poacher_count, seed=seeds[-1])
+        bounds = np.linspace(0, height, n_tiles + 1).astype(int)
+
+        self._shared = SharedMemory(create=True, size=n_tiles * 3 * 8)
+        self._counts = np.ndarray((n_tiles, 3), dtype=np.int64, buffer=self._shared.buf)
+        links = [multiprocessing.Pipe() for _ in range(n_tiles)]
+        self._commands = []
+        self._workers = []
+        for i in range(n_tiles):
+            x0, x1 = bounds[i], bounds[i + 1]
+            mask = (start.x >= x0) & (start.x < x1)
+            tile = Tile(height, width, x0, x1 - x0,
+                        (start.x[mask], start.y[mask], start.species[mask], start.energy[mask]), seeds[i])
+            self._counts[i] = tile.counts
+            commands, worker_commands = multiprocessing.Pipe()
+            # Link i joins tile i to tile i + 1, wrapping around the torus.
+            worker = multiprocessing.Process(
+                target=_run_tile, daemon=True,
+                args=(tile, i, worker_commands, links[i - 1][1], links[i][0], self._shared.name, n_tiles))
+            worker.start()
+            self._commands.append(commands)
+            self._workers.append(worker)
+
+    @property
+    def prey_count(self):
+        return int(self._counts[:, 0].sum())
+
+    @property
+    def predator_count(self):
+        return int(self._counts[:, 1].sum())
+
+    @property
+    def poacher_count(self):
+        return int(self._counts[:, 2].sum())
+
+    def step(self):
+        for commands in self._commands:
+            commands.send('step')
+        for commands in self._commands:
+            commands.recv()
+        self.steps += 1
+
+    def close(self):
+        for commands in self._commands:
+            commands.send('close')
+        for worker in self._workers:
+            worker.join()
+        del self._counts
+        self._shared.close()
+        self._shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    with TiledPreyPredatorModel(
+            height=1000, width=1000, prey_count=300000, predator_count=100000, poacher_count=20000) as model:
+        step_count = 100
+        steps = 0
+
+        while steps < step_count:
+            model.step()
+            print(
+                f'Prey Count: {model.prey_count}, Predator Count: {model.predator_count}, Poacher Count: {model.poacher_count}')
+            steps += 1
+
+
+if __name__ == '__main__':
+    main()
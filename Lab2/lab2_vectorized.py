@@ -0,0 +1,170 @@
+import numpy as np
+
+# Species codes used in the `species` array.
+PREY, PREDATOR, POACHER = 0, 1, 2
+INITIAL_ENERGY = np.array([100, 100, 50], dtype=np.int32)
+
+# Moore neighbourhood offsets, in the same order as MultiGrid.get_neighborhood.
+MOORE_OFFSETS = np.array(
+    [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy], dtype=np.int32)
+
+
+# Position of every element of a sorted array within its run of equal values.
+def _rank(sorted_values):
+    starts = np.searchsorted(sorted_values, sorted_values, side='left')
+    return np.arange(sorted_values.size) - starts
+
+
+# Array-backed version of PreyPredatorModel. Every agent is a row in a set of
+# parallel arrays and each phase of a step is done for all agents at once, so
+# agents act simultaneously instead of one at a time in random order.
+class VectorizedPreyPredatorModel:
+    def __init__(self, height, width, prey_count, predator_count, poacher_count, seed=None):
+        self.height = height
+        self.width = width
+        self.rng = np.random.default_rng(seed)
+        self.running = True
+        self.steps = 0
+        # Rows of the grid this model owns. The whole grid, unless it is one
+        # tile of a TiledPreyPredatorModel.
+        self.x0 = 0
+        self.rows = height
+
+        total = prey_count + predator_count + poacher_count
+        if total > height * width:
+            raise ValueError('ERROR: No empty cells')
+
+        # Like move_to_empty, every agent starts in its own cell.
+        cells = self.rng.choice(height * width, size=total, replace=False)
+        self.x, self.y = np.divmod(cells.astype(np.int32), np.int32(width))
+        self.species = np.repeat(
+            np.array([PREY, PREDATOR, POACHER], dtype=np.int8),
+            [prey_count, predator_count, poacher_count])
+        self.energy = INITIAL_ENERGY[self.species]
+        self.alive = np.ones(total, dtype=bool)
+        self.counts = np.bincount(self.species, minlength=3)
+
+    @property
+    def prey_count(self):
+        return int(self.counts[PREY])
+
+    @property
+    def predator_count(self):
+        return int(self.counts[PREDATOR])
+
+    @property
+    def poacher_count(self):
+        return int(self.counts[POACHER])
+
+    # Cell number of every agent within the owned rows.
+    def _cells(self):
+        return (self.x - self.x0) * self.width + self.y
+
+    # Every agent moves to a random cell of its Moore neighbourhood.
+    def _move(self):
+        offsets = MOORE_OFFSETS[self.rng.integers(0, 8, size=self.x.size)]
+        self.x = (self.x + offsets[:, 0]) % self.height
+        self.y = (self.y + offsets[:, 1]) % self.width
+
+    # Pairs each hunter with a different target in the same cell. Hunters and
+    # targets are shuffled first, which gives the same outcome as hunters
+    # taking turns and each picking a random target that is still there.
+    def _match(self, hunters, targets):
+        cells = self._cells()
+        n_cells = self.rows * self.width
+
+        hunters = np.flatnonzero(hunters)
+        hunters = hunters[self.rng.permutation(hunters.size)]
+        hunters = hunters[np.argsort(cells[hunters], kind='stable')]
+        targets = np.flatnonzero(targets)
+        targets = targets[self.rng.permutation(targets.size)]
+        targets = targets[np.argsort(cells[targets], kind='stable')]
+
+        hunter_cells = cells[hunters]
+        target_cells = cells[targets]
+        targets_per_cell = np.bincount(target_cells, minlength=n_cells)
+        hunters_per_cell = np.bincount(hunter_cells, minlength=n_cells)
+
+        successful = hunters[_rank(hunter_cells) < targets_per_cell[hunter_cells]]
+        taken = targets[_rank(target_cells) < hunters_per_cell[target_cells]]
+        return successful, taken
+
+    # Predators eat one prey in their cell.
+    def _eat(self):
+        predators, prey = self._match(
+            self.alive & (self.species == PREDATOR),
+            self.alive & (self.species == PREY))
+        self.energy[predators] += 100
+        self.alive[prey] = False
+
+    # Poachers with enough energy kill one predator in their cell.
+    def _poach(self):
+        poachers, predators = self._match(
+            self.alive & (self.species == POACHER) & (self.energy >= 5),
+            self.alive & (self.species == PREDATOR))
+        self.energy[poachers] -= 5
+        self.alive[predators] = False
+
+    # Prey and predators with enough energy spawn a newborn in a random empty
+    # cell. Returns the newborns so they can be added after energy decay.
+    def _breed(self):
+        parents = np.flatnonzero(
+            self.alive & (self.species != POACHER) & (self.energy >= 200))
+        occupancy = np.bincount(
+            self._cells()[self.alive], minlength=self.rows * self.width)
+        empty = np.flatnonzero(occupancy == 0)
+        # Only as many parents breed as there are empty cells left.
+        if parents.size > empty.size:
+            parents = self.rng.permutation(parents)[:empty.size]
+
+        self.energy[parents] -= 100
+        cells = self.rng.choice(empty, size=parents.size, replace=False)
+        x, y = np.divmod(cells.astype(np.int32), np.int32(self.width))
+        x += self.x0
+        species = self.species[parents]
+        return x, y, species, INITIAL_ENERGY[species]
+
+    def _decay(self):
+        self.energy -= 1
+
+    # Drops dead agents and appends newborns.
+    def _compact(self, newborns):
+        x, y, species, energy = newborns
+        keep = self.alive
+        self.x = np.concatenate((self.x[keep], x))
+        self.y = np.concatenate((self.y[keep], y))
+        self.species = np.concatenate((self.species[keep], species))
+        self.energy = np.concatenate((self.energy[keep], energy))
+        self.alive = np.ones(self.x.size, dtype=bool)
+        self.counts = np.bincount(self.species, minlength=3)
+
+    # Everything in a step after moving. Agents only interact with agents in
+    # the same cell.
+    def _settle(self):
+        self._eat()
+        self._poach()
+        newborns = self._breed()
+        self._decay()
+        self._compact(newborns)
+        self.steps += 1
+
+    def step(self):
+        self._move()
+        self._settle()
+
+
+def main():
+    model = VectorizedPreyPredatorModel(
+        height=10, width=10, prey_count=20, predator_count=7, poacher_count=3)
+    step_count = 100
+    steps = 0
+
+    while steps < step_count:
+        model.step()
+        print(
+            f'Prey Count: {model.prey_count}, Predator Count: {model.predator_count}, Poacher Count: {model.poacher_count}')
+        steps += 1
+
+
+if __name__ == '__main__':
+    main()
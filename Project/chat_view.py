@@ -0,0 +1,61 @@
+import math
+
+import streamlit as st
+
+# Turns drawn in full at the bottom of the chat; older ones are collapsed
+RECENT_TURNS = 10
+# Older turns drawn per page of the collapsed history
+PAGE_TURNS = 10
+
+
+class MessageView:
+    """A chat message prepared for display once: the role to show it under, its parsed content and the function that draws it"""
+
+    def __init__(self, role, content, draw=st.markdown):
+        self.role = role
+        self.content = content
+        self.draw = draw
+
+    def render(self):
+        with st.chat_message(self.role):
+            self.draw(self.content)
+
+
+def message_views(key, parse):
+    """Views of the messages in st.session_state[key], calling `parse` (which may return None to hide a message) only on messages added since the last rerun"""
+    messages = st.session_state[key]
+    views, source = st.session_state.get(f'{key}_views', ([], None))
+    # The list is appended to in place; a new list means the conversation was reset
+    if source is not messages or len(views) > len(messages):
+        views = []
+    views.extend(parse(message) for message in messages[len(views):])
+    st.session_state[f'{key}_views'] = (views, messages)
+    return [view for view in views if view is not None]
+
+
+def render_history(key, parse, recent=RECENT_TURNS, page_size=PAGE_TURNS):
+    """Draws the messages in st.session_state[key]: messages before the first user message and the latest `recent` turns in full,
+    older turns in an expander one page at a time, so a rerun draws the same amount however long the conversation is"""
+    views = message_views(key, parse)
+    lead = 0
+    while lead < len(views) and views[lead].role != 'user':
+        lead += 1
+    turns = []
+    for view in views[lead:]:
+        if view.role == 'user' or not turns:
+            turns.append([])
+        turns[-1].append(view)
+
+    for view in views[:lead]:
+        view.render()
+    older, latest = turns[:-recent], turns[-recent:]
+    if older:
+        with st.expander(f'{len(older)} earlier turns'):
+            pages = math.ceil(len(older) / page_size)
+            page = st.number_input('Page', min_value=1, max_value=pages, value=pages, key=f'{key}_page') if pages > 1 else 1
+            for turn in older[(page - 1) * page_size:page * page_size]:
+                for view in turn:
+                    view.render()
+    for turn in latest:
+        for view in turn:
+            view.render()
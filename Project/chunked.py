@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import weakref
+from contextlib import suppress
+
+import numpy as np
+import pandas as pd
+
+from column_index import parse_conjunction
+from stats import ColumnSketch
+
+CHUNK_SIZE = 100_000
+PREVIEW_ROWS = 1_000
+# Uploads larger than this are kept on disk and queried chunk by chunk
+OUT_OF_CORE_BYTES = 200 * 2**20
+
+
+class SpooledFile:
+    """A temporary file that is deleted once nothing refers to it any more"""
+
+    def __init__(self, path):
+        self.path = path
+        weakref.finalize(self, remove, path)
+
+
+def remove(path):
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+class UnsupportedQuery(ValueError):
+    """A query a ChunkedFrame cannot run one chunk at a time"""
+
+
+class ChunkedFrame:
+    """A CSV file on disk with a chain of queries and column selections applied lazily, one chunk at a time.
+    `source` is a path or a SpooledFile, which every frame derived from this one keeps alive."""
+
+    def __init__(self, source, operations=(), chunksize=CHUNK_SIZE):
+        self.source = source
+        self.path = source.path if isinstance(source, SpooledFile) else source
+        self.operations = tuple(operations)
+        self.chunksize = chunksize
+        self.columns = self._apply(pd.read_csv(self.path, nrows=0)).columns
+
+    def query(self, expr):
+        """The rows matching `expr`, which must be comparisons of columns with literals: other filters
+        (e.g. `b > b.mean()`) may depend on rows outside the chunk, so they are rejected rather than answered wrong"""
+        if not parse_conjunction(expr):
+            raise UnsupportedQuery(
+                f'{expr!r} cannot filter a file this large: use only comparisons of a column with a value, '
+                f'joined by &, e.g. "a > 5 & b == \'x\'"')
+        return ChunkedFrame(self.source, self.operations + (('query', expr),), self.chunksize)
+
+    def __getitem__(self, columns):
+        return ChunkedFrame(self.source, self.operations + (('columns', list(columns)),), self.chunksize)
+
+    def _apply(self, chunk):
+        for operation, argument in self.operations:
+            chunk = chunk.query(argument) if operation == 'query' else chunk.loc[:, argument]
+        return chunk
+
+    def chunks(self):
+        with pd.read_csv(self.path, chunksize=self.chunksize) as reader:
+            for chunk in reader:
+                yield self._apply(chunk)
+
+    def head(self, n=5):
+        rows = []
+        for chunk in self.chunks():
+            rows.append(chunk.head(n - sum(map(len, rows))))
+            if sum(map(len, rows)) >= n:
+                break
+        return pd.concat(rows) if rows else self._apply(pd.read_csv(self.path, nrows=0))
+
+    def describe(self):
+        """Same statistics as DataFrame.describe, computed in one pass by merging a sketch of each chunk.
+        Like DataFrame.describe, a frame with no numeric columns has count, unique, top and freq of every column instead."""
+        rng = np.random.default_rng(0)
+        columns = None
+        sketch = None
+        counts = None
+        for chunk in self.chunks():
+            if columns is None:
+                columns = chunk.select_dtypes('number').columns
+            if columns.empty:
+                chunk_counts = {column: chunk[column].value_counts(sort=False) for column in chunk.columns}
+                counts = chunk_counts if counts is None else {
+                    column: counts[column].add(chunk_counts[column], fill_value=0) for column in counts}
+                continue
+            values = chunk[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+            chunk_sketch = ColumnSketch.of(columns, values, rng.random(len(values)))
+            sketch = chunk_sketch if sketch is None else sketch.merge(chunk_sketch)
+        if counts is not None:
+            return describe_counts(counts)
+        return sketch.describe() if sketch is not None else pd.DataFrame()
+
+
+def describe_counts(counts):
+    """count, unique, top and freq of each column from its merged value counts"""
+    described = {}
+    for column, values in counts.items():
+        values = values[values > 0]
+        if values.empty:
+            described[column] = [0, 0, np.nan, np.nan]
+        else:
+            described[column] = [int(values.sum()), len(values), values.idxmax(), int(values.max())]
+    return pd.DataFrame(described, index=['count', 'unique', 'top', 'freq'], dtype=object)
+
+
+def spool(uploaded_file):
+    """Copies an upload to a temporary file on disk, deleted once the frames reading it are gone (e.g. evicted from the dataset store)"""
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, f)
+    return SpooledFile(f.name)
+
+
+def preview(data, rows=PREVIEW_ROWS):
+    """The first `rows` rows of a frame in memory or on disk, so what is kept and drawn stays bounded"""
+    return data.head(rows)
@@ -0,0 +1,69 @@
+import itertools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils import CACHE_DIR, save_arrays
+
+SEPARATOR = b',,'
+DEFAULT_COLUMNS = ['Code', 'Description']
+# An ICD-10 code, e.g. C85.80
+CODE_PATTERN = re.compile(r'[A-Z]\d[\dA-Z.]*')
+
+
+def is_header(line):
+    """Whether the first line of a codes file names its columns, which it does unless it starts with a code"""
+    return not CODE_PATTERN.fullmatch(line.partition(SEPARATOR.decode())[0].strip())
+
+
+def parse_codes(file):
+    """Reads a `code,,description` file line by line. Each line is split on its first ',,' only, so descriptions may contain commas.
+    The first line is the header, unless it starts with a code: then it is data and DEFAULT_COLUMNS are used."""
+    file.seek(0)
+    lines = (line.rstrip(b'\r\n') for line in file)
+    first = next(lines, b'')
+    header = first.decode('utf-8-sig')
+    if is_header(header):
+        columns = [name.strip() for name in header.split(SEPARATOR.decode(), 1)] if SEPARATOR.decode() in header else DEFAULT_COLUMNS
+    else:
+        columns = DEFAULT_COLUMNS
+        lines = itertools.chain([header.encode()], lines)
+
+    codes, descriptions = [], []
+    for line in lines:
+        if not line.strip():
+            continue
+        code, _, description = line.partition(SEPARATOR)
+        codes.append(code.decode().strip())
+        descriptions.append(description.decode().strip())
+    file.seek(0)
+    return pd.DataFrame({columns[0]: codes, columns[1]: descriptions})
+
+
+def pack_strings(values):
+    """UTF-8 bytes of `values` joined by newlines, which no code or description contains: about the size of the file,
+    where fixed-width unicode arrays take 4 bytes per character of the longest value"""
+    return np.frombuffer('\n'.join(values).encode(), dtype=np.uint8)
+
+
+def unpack_strings(packed, rows):
+    return packed.tobytes().decode().split('\n') if rows else []
+
+
+def load_codes(file, key):
+    """The code table of an uploaded file, read from a columnar .npz in CACHE_DIR if one was already saved for `key` (its content hash)"""
+    # v4: earlier versions could drop a first code or read a header as one, and stored fixed-width strings
+    path = os.path.join(CACHE_DIR, f'{key}.codes-v4.npz')
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as f:
+            columns, rows = f['columns'].tolist(), int(f['rows'])
+            return pd.DataFrame({
+                columns[0]: unpack_strings(f['codes'], rows), columns[1]: unpack_strings(f['descriptions'], rows)}, dtype=object)
+
+    df = parse_codes(file)
+    save_arrays(
+        path, columns=np.array(df.columns, dtype=str), rows=len(df),
+        codes=pack_strings(df.iloc[:, 0]), descriptions=pack_strings(df.iloc[:, 1]))
+    return df
@@ -0,0 +1,123 @@
+import ast
+import io
+import tokenize
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+# The same comparison with its operands swapped, for predicates like `5 < column`
+FLIPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+
+def _comparison(left, op, right):
+    """(column, operator, value) for a comparison between a column name and a literal, otherwise None"""
+    if type(op) not in OPERATORS:
+        return None
+    op = OPERATORS[type(op)]
+    if isinstance(right, ast.Name):
+        left, right, op = right, left, FLIPPED[op]
+    if not isinstance(left, ast.Name):
+        return None
+    try:
+        value = ast.literal_eval(right)
+    except ValueError:
+        return None
+    if not isinstance(value, (int, float, str)):
+        return None
+    return left.id, op, value
+
+
+def _query_booleans(expr):
+    """`expr` with `&` read as `and`, as DataFrame.query reads it, so `a > 1 & b < 2` compares before it joins"""
+    tokens = tokenize.generate_tokens(io.StringIO(expr.strip()).readline)
+    return tokenize.untokenize(
+        (tokenize.NAME, 'and') if token.type == tokenize.OP and token.string == '&' else (token.type, token.string)
+        for token in tokens)
+
+
+def parse_conjunction(expr):
+    """Splits a query into (column, operator, value) terms if it is a conjunction of simple comparisons, otherwise None"""
+    try:
+        tree = ast.parse(_query_booleans(expr), mode='eval').body
+    except (SyntaxError, tokenize.TokenError):
+        return None
+    terms = []
+
+    def visit(node):
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            return all(visit(value) for value in node.values)
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+            return visit(node.left) and visit(node.right)
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            for left, op, right in zip(operands, node.ops, operands[1:]):
+                term = _comparison(left, op, right)
+                if term is None:
+                    return False
+                terms.append(term)
+            return True
+        return False
+
+    return terms if visit(tree) else None
+
+
+class ColumnIndex:
+    """Sorted index over one column: the row positions of its non-null values, ordered by value"""
+
+    def __init__(self, values:pd.Series):
+        values = values.to_numpy()
+        positions = np.flatnonzero(~pd.isna(values))
+        order = np.argsort(values[positions], kind='stable')
+        self.positions = positions[order]
+        self.sorted = values[positions][order]
+        self.size = len(values)
+
+    def lookup(self, op, value):
+        """Boolean row mask of `column <op> value`, with the same null handling as DataFrame.query"""
+        if isinstance(value, str) != (self.sorted.dtype == object):
+            raise TypeError(f'Cannot compare {self.sorted.dtype} values with {value!r}')
+        left = np.searchsorted(self.sorted, value, side='left')
+        right = np.searchsorted(self.sorted, value, side='right')
+        matches = {
+            '==': slice(left, right), '!=': slice(left, right),
+            '<': slice(0, left), '<=': slice(0, right),
+            '>': slice(right, None), '>=': slice(left, None),
+        }[op]
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.positions[matches]] = True
+        return ~mask if op == '!=' else mask
+
+
+class DatasetIndex:
+    """Column indexes for one dataset, each built the first time its column appears in a predicate"""
+
+    def __init__(self, data:pd.DataFrame):
+        self.data = data
+        self.indexes = {}
+
+    def _index(self, column):
+        if column not in self.indexes:
+            try:
+                self.indexes[column] = ColumnIndex(self.data[column])
+            except TypeError:
+                # Values that cannot be ordered, e.g. mixed strings and numbers
+                self.indexes[column] = None
+        return self.indexes[column]
+
+    def select(self, expr):
+        """Boolean row mask for a query made only of range and equality predicates on columns, otherwise None"""
+        terms = parse_conjunction(expr)
+        if not terms or any(column not in self.data.columns for column, _, _ in terms):
+            return None
+        mask = None
+        for column, op, value in terms:
+            index = self._index(column)
+            if index is None:
+                return None
+            try:
+                term = index.lookup(op, value)
+            except (TypeError, ValueError):
+                return None
+            mask = term if mask is None else mask & term
+        return mask
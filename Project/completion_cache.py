@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from history import as_dict
+from utils import CACHE_DIR
+
+CACHE_PATH = os.path.join(CACHE_DIR, 'completions.sqlite3')
+# Total size of the cached responses; the least recently used are evicted past it
+MAX_BYTES = 64 * 2**20
+# Cached responses are replayed in pieces of this many characters
+REPLAY_CHARS = 16
+
+
+def normalize(message):
+    """The parts of a message that affect the response, with runs of whitespace in its text collapsed"""
+    message = as_dict(message)
+    normalized = {key: message[key] for key in ('role', 'name', 'tool_call_id', 'tool_calls') if message.get(key)}
+    if isinstance(message.get('content'), str):
+        normalized['content'] = re.sub(r'\s+', ' ', message['content']).strip()
+    return normalized
+
+
+def request_key(model, messages, tools=None):
+    """SHA-256 of the model, normalized messages and tool schema of a chat completion request"""
+    request = {'model': model, 'messages': [normalize(message) for message in messages], 'tools': tools}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, separators=(',', ':'), default=str).encode()).hexdigest()
+
+
+class CompletionCache:
+    """Responses of chat completion requests in an sqlite3 file, shared across sessions and restarts, evicted least recently used first"""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, response TEXT, size INTEGER, used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS completions_used ON completions (used)')
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM completions WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.connection.execute('UPDATE completions SET used = ? WHERE key = ?', (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, key, response):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)', (key, response, len(response.encode()), time.time()))
+            total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM completions').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = []
+                for old_key, size in self.connection.execute('SELECT key, size FROM completions ORDER BY used'):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                self.connection.executemany('DELETE FROM completions WHERE key = ?', evicted)
+
+
+@st.cache_resource
+def completion_cache():
+    return CompletionCache()
+
+
+def replay(response):
+    for start in range(0, len(response), REPLAY_CHARS):
+        yield response[start:start + REPLAY_CHARS]
+
+
+def write_completion(client, model, messages, use_cache=True):
+    """st.write_stream of a streamed chat completion. With `use_cache`, a request made before is replayed from the completion cache instead of calling the API."""
+    if not use_cache:
+        return st.write_stream(client.chat.completions.create(model=model, messages=messages, stream=True))
+
+    key = request_key(model, messages)
+    response = completion_cache().get(key)
+    if response is not None:
+        return st.write_stream(replay(response))
+    response = st.write_stream(client.chat.completions.create(model=model, messages=messages, stream=True))
+    if isinstance(response, str) and response:
+        completion_cache().put(key, response)
+    return response
@@ -0,0 +1,78 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from tools import describe_data, selection, projection, reset_data, undo
+
+AVAILABLE_FUNCTIONS = {
+    'describe_data': describe_data,
+    'selection': selection,
+    'projection': projection,
+    'reset_data': reset_data,
+    'undo': undo,
+}
+# Tools that only read the session's dataset, so consecutive calls to them can run at the same time
+READ_ONLY = {'describe_data'}
+
+# Shared by all sessions
+POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tool')
+
+
+def call_tool(tool_call):
+    """Runs one tool call and returns its JSON response"""
+    function_name = tool_call.function.name
+    function_to_call = AVAILABLE_FUNCTIONS[function_name]
+    function_args = json.loads(tool_call.function.arguments or '{}')
+
+    if function_name == 'selection':
+        return function_to_call(prompt=function_args.get('prompt'))
+    if function_name == 'projection':
+        return function_to_call(columns=function_args.get('columns'))
+    return function_to_call()
+
+
+def call_key(tool_call):
+    """(name, arguments) of a tool call, with its arguments in canonical JSON so equal calls get equal keys"""
+    arguments = json.loads(tool_call.function.arguments or '{}')
+    return tool_call.function.name, json.dumps(arguments, sort_keys=True)
+
+
+def _call_in_context(ctx, tool_call):
+    # Gives the worker thread the session's script context, so tools can use st.session_state
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return call_tool(tool_call)
+
+
+def batches(tool_calls):
+    """Splits tool calls into runs of consecutive read-only calls and single mutating calls, keeping their order"""
+    batch = []
+    for tool_call in tool_calls:
+        if tool_call.function.name in READ_ONLY:
+            batch.append(tool_call)
+            continue
+        if batch:
+            yield batch
+            batch = []
+        yield [tool_call]
+    if batch:
+        yield batch
+
+
+def execute_tool_calls(tool_calls):
+    """Runs a model's tool calls, yielding (tool_call, response) as each finishes.
+    Consecutive read-only calls run concurrently on POOL, identical ones only once; mutating calls run one at a time, in the order the model made them."""
+    ctx = get_script_run_ctx()
+    for batch in batches(tool_calls):
+        if len(batch) == 1:
+            yield batch[0], call_tool(batch[0])
+            continue
+        calls = {}
+        for tool_call in batch:
+            calls.setdefault(call_key(tool_call), []).append(tool_call)
+        futures = {POOL.submit(_call_in_context, ctx, same[0]): same for same in calls.values()}
+        for future in as_completed(futures):
+            response = future.result()
+            for tool_call in futures[future]:
+                yield tool_call, response
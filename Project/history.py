@@ -0,0 +1,99 @@
+import json
+from functools import lru_cache
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    ENCODING = None
+
+# Tokens the API adds around every message
+MESSAGE_OVERHEAD = 4
+# Length older messages are cut to when their turn is compacted
+SUMMARY_CHARS = 200
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """Tokens in `text` with the models' tokenizer, or about 4 characters per token without tiktoken"""
+    if ENCODING is not None:
+        return len(ENCODING.encode(text))
+    return len(text) // 4 + 1
+
+
+def as_dict(message):
+    """Messages may be dicts or ChatCompletionMessage objects returned by the API"""
+    return message if isinstance(message, dict) else message.model_dump(exclude_none=True)
+
+
+def message_tokens(message):
+    tokens = MESSAGE_OVERHEAD + count_tokens(str(message.get('content') or ''))
+    for tool_call in message.get('tool_calls') or ():
+        tokens += count_tokens(tool_call['function']['name'] + tool_call['function']['arguments'])
+    return tokens
+
+
+def turns(messages):
+    """Splits messages into turns, each starting at a user message, so tool calls stay with their responses"""
+    grouped = []
+    for message in messages:
+        if message['role'] == 'user' or not grouped:
+            grouped.append([])
+        grouped[-1].append(message)
+    return grouped
+
+
+def summarize_payload(content):
+    """Short stand-in for an old tool response: a result's handle, shape and columns, or its first characters"""
+    try:
+        response = json.loads(content)
+    except (TypeError, ValueError):
+        response = None
+    if isinstance(response, dict) and 'handle' in response:
+        return json.dumps({key: response[key] for key in ('handle', 'shape', 'columns') if key in response})
+    if isinstance(response, dict) and 'data' in response:
+        return json.dumps({'summary': f"{len(response['data'])} columns described, details omitted"})
+    return shorten(content)
+
+
+def shorten(content):
+    content = str(content or '')
+    return content if len(content) <= SUMMARY_CHARS else content[:SUMMARY_CHARS] + ' [...]'
+
+
+def compact(turn):
+    """The turn with tool responses summarized and long messages cut short, keeping every tool call and its id"""
+    compacted = []
+    for message in turn:
+        message = dict(message)
+        if message['role'] == 'tool':
+            message['content'] = summarize_payload(message['content'])
+        elif message.get('content'):
+            message['content'] = shorten(message['content'])
+        compacted.append(message)
+    return compacted
+
+
+def fit_history(messages, budget):
+    """Messages to send so the request stays within `budget` tokens: system messages and the most recent turns verbatim,
+    older turns compacted, and the oldest left out once even their compact form does not fit. The latest turn is always sent."""
+    messages = [as_dict(message) for message in messages]
+    system = []
+    while len(system) < len(messages) and messages[len(system)]['role'] == 'system':
+        system.append(messages[len(system)])
+    remaining = budget - sum(map(message_tokens, system))
+
+    kept = []
+    grouped = turns(messages[len(system):])
+    for age, turn in enumerate(reversed(grouped)):
+        tokens = sum(map(message_tokens, turn))
+        if tokens > remaining and age:
+            turn = compact(turn)
+            tokens = sum(map(message_tokens, turn))
+        if tokens > remaining and age:
+            omitted = sum(map(len, grouped[:len(grouped) - age]))
+            kept.insert(0, [{'role': 'system', 'content': f'{omitted} earlier messages of this conversation were left out.'}])
+            break
+        kept.insert(0, turn)
+        remaining -= tokens
+    return system + [message for turn in kept for message in turn]
@@ -1,8 +1,10 @@
 import streamlit as st
-from openai import OpenAI
 
-from utils import authenticate, submit_system_prompt
-from state import establish_openai_model, establish_openai_key
+from utils import authenticate, submit_system_prompt, get_client
+from chat_view import MessageView, render_history
+from completion_cache import write_completion
+from history import fit_history
+from state import establish_openai_model, establish_openai_key, establish_history_budget, history_budget_input, completion_cache_toggle
 
 st.set_page_config(page_title='Custom System Prompt')
 st.title('Custom System Prompt')
@@ -17,19 +19,22 @@ if 'openai_key' not in st.session_state:
 if 'authenticated' not in st.session_state:
     authenticate()
 
+if 'history_budget' not in st.session_state:
+    establish_history_budget()
+
 if st.session_state.authenticated:
     if 'client' not in st.session_state:
-        st.session_state.client = OpenAI(api_key=st.session_state.openai_key)
+        st.session_state.client = get_client()
 
     with st.sidebar:
+        history_budget_input()
+        use_completion_cache = completion_cache_toggle()
         system_prompt = st.text_area('System Prompt', placeholder='Enter a custom system prompt for your chatbot', key='system_prompt', on_change=submit_system_prompt)
 
     if 'messages_sp' not in st.session_state:
         st.session_state.messages_sp = [{'role': 'system', 'content': system_prompt}]
 
-    for message in st.session_state.messages_sp:
-        with st.chat_message(message['role']):
-            st.markdown(message['content'])
+    render_history('messages_sp', lambda message: MessageView(message['role'], message['content']))
 
 
     if prompt := st.chat_input("What is up?"):
@@ -38,12 +43,10 @@ if st.session_state.authenticated:
         st.session_state.messages_sp.append({"role": "user", "content": prompt})
 
         with st.chat_message('assistant'):
-            client = st.session_state.client
-            stream = client.chat.completions.create(
-                model=st.session_state.openai_model, 
-                messages=st.session_state.messages_sp,
-                stream=True,
+            response = write_completion(
+                st.session_state.client, st.session_state.openai_model,
+                fit_history(st.session_state.messages_sp, st.session_state.history_budget),
+                use_cache=use_completion_cache,
             )
-            response = st.write_stream(stream)
 
         st.session_state.messages_sp.append({"role": "assistant", "content": response})
\ No newline at end of file
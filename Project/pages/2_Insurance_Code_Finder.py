@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
-from openai import OpenAI
 
-from utils import authenticate, submit_num_results
-from state import establish_openai_model, establish_openai_key
+from store import codes_dataset, dataset_store
+from utils import CANDIDATE_SEPARATOR, authenticate, code_finder_prompt, content_hash, submit_num_results, get_client
+from chat_view import MessageView, render_history
+from completion_cache import write_completion
+from history import fit_history
+from state import establish_openai_model, establish_openai_key, establish_history_budget, history_budget_input, completion_cache_toggle
 
 st.set_page_config(page_title='Insurance Code Finder')
 st.title('Insurance Code Finder')
@@ -18,12 +20,18 @@ if 'openai_key' not in st.session_state:
 if 'authenticated' not in st.session_state:
     authenticate()
 
+if 'history_budget' not in st.session_state:
+    establish_history_budget()
+
 if st.session_state.authenticated:
     with st.sidebar:
+        history_budget_input()
+        use_completion_cache = completion_cache_toggle()
         num_results = st.number_input('Number of results', value=1, min_value=1, max_value=10, step=1, key='num_results', on_change=submit_num_results)
+        ranking = st.radio('Ranking', options=['Model', 'Local only'], help='Local only ranks codes by text similarity, without calling the model')
 
     if 'client' not in st.session_state:
-        st.session_state.client = OpenAI(api_key=st.session_state.openai_key)
+        st.session_state.client = get_client()
 
     if 'codes' not in st.session_state:
         uploaded_file = st.file_uploader('Choose a file')
@@ -31,45 +39,48 @@ if st.session_state.authenticated:
         if uploaded_file is None:
             st.stop()
         else:
-            df = pd.read_csv(uploaded_file, delimiter=',,')
-            st.session_state.codes = df
+            # Sessions uploading the same file share one parsed copy and its retrieval index
+            key = content_hash(uploaded_file)
+            dataset = dataset_store().get(key, lambda: codes_dataset(uploaded_file, key))
+            st.session_state.codes = dataset.view()
+            # Questions are answered from the codes this index retrieves, not the whole table
+            st.session_state.code_index = dataset.index
 
     if 'messages_icf' not in st.session_state:
-        st.session_state.messages_icf = [
-            {"role": "system", "content":
-                f'''
-                You will act as an insurance agent that will compare the following insurance codes to a provided input. 
-                Compare the code descriptions and the provided input and output the {num_results} most relevant results.
-                Provided Insurance Codes: 
-                ---
-                {st.session_state.codes.to_string()}
-                '''
-            }
-        ]
-
-    for message in st.session_state.messages_icf:
+        st.session_state.messages_icf = [{"role": "system", "content": code_finder_prompt(num_results)}]
+
+    def parse_message(message):
+        # The system prompt is shown with the code table; questions without the candidates retrieved for them
         if message['role'] == 'system':
-            split = message['content'].split('---')
-            with st.chat_message(message['role']):
-                st.markdown(split[0])
-                st.dataframe(st.session_state.codes)
-        else:
-            with st.chat_message(message['role']):
-                st.markdown(message['content'])
+            return MessageView('system', message['content'].split('---')[0], lambda text: (st.markdown(text), st.dataframe(st.session_state.codes)))
+        return MessageView(message['role'], message['content'].split(CANDIDATE_SEPARATOR)[0])
+
+    render_history('messages_icf', parse_message)
 
 
     if prompt := st.chat_input("What is up?"):
         with st.chat_message("user"):
             st.markdown(prompt)
-        st.session_state.messages_icf.append({"role": "user", "content": prompt})
-
-        with st.chat_message('assistant'):
-            client = st.session_state.client
-            stream = client.chat.completions.create(
-                model=st.session_state.openai_model, 
-                messages=st.session_state.messages_icf,
-                stream=True,
-            )
-            response = st.write_stream(stream)
+        positions, scores = st.session_state.code_index.search(prompt)
+        candidates = st.session_state.codes.iloc[positions]
+
+        if ranking == 'Local only':
+            st.session_state.messages_icf.append({"role": "user", "content": prompt})
+            with st.chat_message('assistant'):
+                if len(candidates):
+                    response = '\n'.join(
+                        f'{rank}. {" - ".join(map(str, row))} (score {score:.2f})'
+                        for rank, (row, score) in enumerate(zip(candidates.head(num_results).itertuples(index=False), scores), 1))
+                else:
+                    response = 'No codes match this description.'
+                st.markdown(response)
+        else:
+            st.session_state.messages_icf.append({"role": "user", "content": prompt + CANDIDATE_SEPARATOR + (candidates.to_string() if len(candidates) else "None")})
+            with st.chat_message('assistant'):
+                response = write_completion(
+                    st.session_state.client, st.session_state.openai_model,
+                    fit_history(st.session_state.messages_icf, st.session_state.history_budget),
+                    use_cache=use_completion_cache,
+                )
 
         st.session_state.messages_icf.append({"role": "assistant", "content": response})
@@ -1,11 +1,16 @@
-from openai import OpenAI
 import json
 import streamlit as st
 import pandas as pd
 
-from tools import describe_data, selection, projection, reset_data
-from state import establish_openai_key, establish_openai_model
-from utils import authenticate
+from tools import render_parsed_response, render_tool_response
+from chat_view import MessageView, render_history
+from executor import execute_tool_calls
+from plan import Plan
+from chunked import preview
+from store import csv_dataset, dataset_store
+from history import fit_history
+from state import establish_openai_key, establish_openai_model, establish_history_budget, history_budget_input
+from utils import authenticate, content_hash, get_client
 
 st.set_page_config(page_title='Dataframe Q&A')
 st.title('Dataframe Q&A')
@@ -20,12 +25,16 @@ if 'openai_key' not in st.session_state:
 if 'authenticated' not in st.session_state:
     authenticate()
 
+if 'history_budget' not in st.session_state:
+    establish_history_budget()
+
 if st.session_state.authenticated:
     with st.sidebar:
+        history_budget_input()
         generate_tool_response = st.radio('Generate model response after tool response', options=['Yes', 'No'])
 
     if 'client' not in st.session_state:
-        st.session_state.client = OpenAI(api_key=st.session_state.openai_key)
+        st.session_state.client = get_client()
 
     if 'data' not in st.session_state:
         uploaded_file = st.file_uploader('Choose a file')
@@ -33,27 +42,34 @@ if st.session_state.authenticated:
         if uploaded_file is None:
             st.stop()
         else:
-            df = pd.read_csv(uploaded_file)
+            # Sessions uploading the same file share one parsed copy, with its column indexes and statistics
+            key = content_hash(uploaded_file)
+            dataset = dataset_store().get(key, lambda: csv_dataset(uploaded_file))
+            df = dataset.view()
             st.session_state.data = df
             st.session_state.original_data = df
+            st.session_state.data_preview = preview(df)
+            st.session_state.data_fingerprint = key
+            st.session_state.data_index = dataset.index
+            st.session_state.data_stats = dataset.stats
+            st.session_state.plan = Plan()
+            st.session_state.plan_history = []
             
     if 'messages_df' not in st.session_state:
         st.session_state.messages_df = []
 
     with st.chat_message('Data'):
-        st.dataframe(st.session_state.original_data, use_container_width=True)
-
-    for message in st.session_state.messages_df:
-        if type(message) == dict:
-            if message['role'] == 'tool':
-                with st.chat_message(message['role']):
-                    if 'data' in message['content']:
-                        st.dataframe(json.loads(message['content'])['data'])
-                    else:
-                        st.json(message)
-            else:
-                with st.chat_message(message['role']):
-                    st.write(message['content'])
+        st.dataframe(st.session_state.data_preview, use_container_width=True)
+
+    def parse_message(message):
+        # Tool-call requests from the model are not shown; tool responses are parsed from JSON once
+        if type(message) != dict:
+            return None
+        if message['role'] == 'tool':
+            return MessageView('tool', json.loads(message['content']), render_parsed_response)
+        return MessageView(message['role'], message['content'], st.write)
+
+    render_history('messages_df', parse_message)
 
     if prompt := st.chat_input("What is up?"):
         data:pd.DataFrame = st.session_state.data
@@ -141,45 +157,43 @@ if st.session_state.authenticated:
                     },
                 },
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "undo",
+                    "description": 
+                        f'''
+                        Undoes the last selection, projection or reset of the dataset. 
+                        Can be called upon requests. 
+                        ''',
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                        },
+                        "required": [],
+                    },
+                },
+            },
         ]
 
         response = st.session_state.client.chat.completions.create(
             model="gpt-3.5-turbo",
-            messages=messages_df,
+            messages=fit_history(messages_df, st.session_state.history_budget),
             tools=tools,
             tool_choice="auto", 
         )
         response_message = response.choices[0].message
         tool_calls = response_message.tool_calls
         if tool_calls:
-            available_functions = {
-                "describe_data": describe_data, 
-                "selection": selection,
-                "projection": projection,
-                "reset_data": reset_data
-            } 
             messages_df.append(response_message)
-            for tool_call in tool_calls:
+            # Responses are shown as they finish; read-only calls run concurrently
+            for tool_call, function_response in execute_tool_calls(tool_calls):
                 function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-
-                if function_name in ('describe_data', 'reset_data'):
-                    function_response = function_to_call()
-                
-                elif function_name == 'selection':
-                    st.write(function_args)
-                    function_response = function_to_call(prompt = function_args.get("prompt"))
-                
-                elif function_name == 'projection':
-                    st.write(function_args)
-                    function_response = function_to_call(columns = function_args.get("columns"))
-                
+                if function_name in ('selection', 'projection'):
+                    st.write(json.loads(tool_call.function.arguments))
+
                 with st.chat_message('tool'):
-                    try:
-                        st.dataframe(json.loads(function_response)['data'])
-                    except:
-                        st.json(function_response)
+                    render_tool_response(function_response)
 
                 messages_df.append(
                     {
@@ -193,7 +207,7 @@ if st.session_state.authenticated:
             if generate_tool_response == 'Yes':
                 stream = st.session_state.client.chat.completions.create(
                     model="gpt-3.5-turbo",
-                    messages=messages_df,
+                    messages=fit_history(messages_df, st.session_state.history_budget),
                     stream=True
                 ) 
 
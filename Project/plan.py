@@ -0,0 +1,125 @@
+import re
+import threading
+from collections import OrderedDict
+
+from column_index import parse_conjunction
+from utils import footprint
+
+# Memory the cached results of all sessions may take, on top of the uploads in the dataset store
+RESULTS_BUDGET = 512 * 2**20
+
+# Column names in a DataFrame.query expression, either `quoted` or bare identifiers
+NAME_PATTERN = re.compile(r'`([^`]+)`|\b([A-Za-z_]\w*)\b')
+
+
+def referenced_columns(expr, columns):
+    """Columns of `columns` that the query expression mentions"""
+    names = {quoted or bare for quoted, bare in NAME_PATTERN.findall(expr)}
+    return [column for column in columns if column in names]
+
+
+class Plan:
+    """An immutable chain of selections (filters) and projections over the uploaded dataset, run lazily"""
+
+    def __init__(self, operations=()):
+        self.operations = tuple(operations)
+
+    def filter(self, expr):
+        return Plan(self.operations + (('filter', expr),))
+
+    def project(self, columns):
+        return Plan(self.operations + (('project', tuple(columns)),))
+
+    def __eq__(self, other):
+        return isinstance(other, Plan) and self.operations == other.operations
+
+    def __hash__(self):
+        return hash(self.operations)
+
+    def __repr__(self):
+        return f'Plan{self.operations}'
+
+    def optimize(self, columns):
+        """Equivalent plan in canonical form: one projection down to the columns still needed, the filters (merged into one predicate when they are all simple comparisons), then the final projection.
+        Plans that pandas would reject (a filter or projection on a column projected away) are returned unchanged so they fail the same way."""
+        columns = list(columns)
+        visible = columns
+        predicates = []
+        needed = set()
+        for operation, argument in self.operations:
+            if operation == 'filter':
+                names = {quoted or bare for quoted, bare in NAME_PATTERN.findall(argument)}
+                if names & (set(columns) - set(visible)):
+                    return self
+                predicates.append(argument)
+                needed.update(referenced_columns(argument, visible))
+            else:
+                if not set(argument) <= set(visible):
+                    return self
+                visible = list(argument)
+
+        operations = []
+        needed.update(visible)
+        pushed = [column for column in columns if column in needed]
+        if pushed != columns:
+            operations.append(('project', tuple(pushed)))
+        # Comparisons of a column with a literal do not depend on which rows are left, so they can be merged.
+        # Any other filter (e.g. `b > b.mean()`) keeps the chain as it was, in order.
+        if len(predicates) > 1 and all(parse_conjunction(predicate) for predicate in predicates):
+            operations.append(('filter', ' & '.join(f'({predicate})' for predicate in predicates)))
+        else:
+            operations.extend(('filter', predicate) for predicate in predicates)
+        if visible != pushed:
+            operations.append(('project', tuple(visible)))
+        return Plan(operations)
+
+    def execute(self, data, index=None):
+        """Runs the plan on `data`. Filters that reach the rows of `data` unchanged are answered from `index` (a DatasetIndex over `data`) when it can."""
+        filtered = False
+        for operation, argument in self.operations:
+            if operation == 'project':
+                data = data[list(argument)]
+                continue
+            # A filter on a column projected away must fail as DataFrame.query does, not be answered from the index
+            terms = parse_conjunction(argument) if index is not None and not filtered else None
+            mask = index.select(argument) if terms and all(column in data.columns for column, _, _ in terms) else None
+            data = data[mask] if mask is not None else data.query(argument)
+            filtered = True
+        return data
+
+
+class ResultCache:
+    """Thread-safe LRU cache of plan results, keyed by (dataset fingerprint, optimized plan), holding at most `max_bytes` of results"""
+
+    def __init__(self, max_bytes=RESULTS_BUDGET):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        size = footprint(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total -= self.sizes[key]
+            self.entries[key] = value
+            self.sizes[key] = size
+            self.total += size
+            self.entries.move_to_end(key)
+            while self.total > self.max_bytes:
+                old_key, _ = self.entries.popitem(last=False)
+                self.total -= self.sizes.pop(old_key)
+
+
+# Shared by all sessions: entries are keyed by the dataset's content hash
+RESULTS = ResultCache()
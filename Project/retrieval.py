@@ -0,0 +1,85 @@
+import os
+import re
+
+import numpy as np
+
+from utils import CACHE_DIR, save_arrays
+
+# Codes sent to the model for each question
+CANDIDATES = 25
+# Words and codes such as `c85.80`
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.[a-z0-9]+)*')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a list of documents, stored as postings: for each term, the documents containing it and their precomputed weights"""
+
+    def __init__(self, terms, indptr, documents, weights, size):
+        self.vocabulary = terms
+        self.terms = {term: i for i, term in enumerate(terms.tolist())}
+        self.indptr, self.documents, self.weights = indptr, documents, weights
+        self.size = int(size)
+
+    @classmethod
+    def build(cls, texts, k1=1.2, b=0.75):
+        vocabulary = {}
+        term_ids, doc_ids = [], []
+        lengths = np.zeros(len(texts))
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc] = len(tokens)
+            term_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            doc_ids.extend([doc] * len(tokens))
+
+        # Term frequency of each (term, document) pair, ordered by term then document
+        size = max(len(texts), 1)
+        pairs, tf = np.unique(np.array(term_ids, dtype=np.int64) * size + np.array(doc_ids, dtype=np.int64), return_counts=True)
+        terms, documents = pairs // size, pairs % size
+        df = np.bincount(terms, minlength=len(vocabulary))
+        idf = np.log(1 + (len(texts) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[documents] / (lengths.mean() if len(texts) and lengths.mean() else 1))
+        weights = idf[terms] * tf * (k1 + 1) / (tf + norm)
+        indptr = np.concatenate(([0], np.cumsum(df)))
+        return cls(np.array(list(vocabulary), dtype=str), indptr, documents, weights, len(texts))
+
+    def scores(self, query):
+        scores = np.zeros(self.size)
+        for token in tokenize(query):
+            term = self.terms.get(token)
+            if term is not None:
+                start, end = self.indptr[term], self.indptr[term + 1]
+                scores[self.documents[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query, k=CANDIDATES):
+        """Positions of the (at most) k best matching documents, best first, and their scores"""
+        scores = self.scores(query)
+        k = min(k, np.count_nonzero(scores))
+        if not k:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+    def save(self, path):
+        save_arrays(path, terms=self.vocabulary, indptr=self.indptr, documents=self.documents, weights=self.weights, size=self.size)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f['terms'], f['indptr'], f['documents'], f['weights'], f['size'])
+
+    @classmethod
+    def cached(cls, key, texts):
+        """The index of the texts `texts()` returns, loaded from CACHE_DIR if one was already built for `key` (a content hash).
+        `texts` is only called when the index has to be built."""
+        path = os.path.join(CACHE_DIR, f'{key}.bm25.npz')
+        if os.path.exists(path):
+            return cls.load(path)
+        index = cls.build(texts())
+        index.save(path)
+        return index
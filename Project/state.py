@@ -11,4 +11,14 @@ def establish_openai_key():
             openai_key = st.text_input('OpenAI API Key', type='password')
             if st.form_submit_button('Submit'):
                 st.session_state.openai_key = openai_key
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+def establish_history_budget():
+    if 'history_budget' not in st.session_state:
+        st.session_state.history_budget = 4000
+
+def history_budget_input():
+    st.number_input('History budget (tokens)', min_value=500, step=500, key='history_budget', help='Older messages are summarized or left out to keep each request within this many tokens')
+
+def completion_cache_toggle():
+    return st.toggle('Reuse cached responses', value=True, help='Answer a request made before, by anyone, from the local response cache instead of the API')
@@ -0,0 +1,112 @@
+import warnings
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+BLOCK_ROWS = 100_000
+SAMPLE_SIZE = 10_000
+STATISTICS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+
+class ColumnSketch:
+    """Mergeable summary of numeric columns: count, mean, sum of squared deviations, min, max, and the SAMPLE_SIZE rows with the smallest random keys"""
+
+    def __init__(self, columns, count, mean, m2, minimum, maximum, keys, sample):
+        self.columns = pd.Index(columns)
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.minimum, self.maximum = minimum, maximum
+        self.keys, self.sample = keys, sample
+
+    @classmethod
+    def of(cls, columns, values, keys):
+        """Sketch of a 2D float array of rows, with one random key per row"""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            count = np.sum(~np.isnan(values), axis=0)
+            mean = np.nan_to_num(np.nanmean(values, axis=0))
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+        minimum = np.fmin.reduce(values, axis=0, initial=np.inf)
+        maximum = np.fmax.reduce(values, axis=0, initial=-np.inf)
+        # Keeping the rows with the smallest keys gives a uniform sample, also after merging
+        keep = np.argpartition(keys, SAMPLE_SIZE)[:SAMPLE_SIZE] if len(keys) > SAMPLE_SIZE else slice(None)
+        return cls(columns, count, mean, m2, minimum, maximum, keys[keep], values[keep])
+
+    def merge(self, other):
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.where(count > 0, self.mean + delta * other.count / count, 0)
+            m2 = self.m2 + other.m2 + np.where(count > 0, delta ** 2 * self.count * other.count / count, 0)
+        keys = np.concatenate((self.keys, other.keys))
+        sample = np.concatenate((self.sample, other.sample))
+        keep = np.argpartition(keys, SAMPLE_SIZE)[:SAMPLE_SIZE] if len(keys) > SAMPLE_SIZE else slice(None)
+        return ColumnSketch(
+            self.columns, count, mean, m2, np.fmin(self.minimum, other.minimum),
+            np.fmax(self.maximum, other.maximum), keys[keep], sample[keep])
+
+    def select(self, columns):
+        """The sketch of a subset of its columns"""
+        positions = self.columns.get_indexer(columns)
+        return ColumnSketch(
+            columns, self.count[positions], self.mean[positions], self.m2[positions], self.minimum[positions],
+            self.maximum[positions], self.keys, self.sample[:, positions])
+
+    def describe(self):
+        """Same statistics as DataFrame.describe. Quantiles are exact up to SAMPLE_SIZE rows and estimated from the sample beyond that."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            std = np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+            if len(self.sample):
+                quantiles = np.nanquantile(self.sample, [0.25, 0.5, 0.75], axis=0)
+            else:
+                quantiles = np.full((3, len(self.columns)), np.nan)
+        empty = self.count == 0
+        mean, minimum, maximum = (np.where(empty, np.nan, stat) for stat in (self.mean, self.minimum, self.maximum))
+        return pd.DataFrame(
+            [self.count.astype(float), mean, std, minimum, *quantiles, maximum],
+            index=STATISTICS, columns=self.columns)
+
+
+class DatasetStats:
+    """Statistics of an uploaded frame, computed once: a sketch per block of BLOCK_ROWS rows and a random key per row"""
+
+    def __init__(self, data:pd.DataFrame, block_rows=BLOCK_ROWS, seed=0):
+        self.rows = data.index
+        self.block_rows = block_rows
+        self.keys = np.random.default_rng(seed).random(len(data))
+        self.columns = data.select_dtypes('number').columns
+        values = data[self.columns].to_numpy(dtype=float)
+        self.blocks = [
+            ColumnSketch.of(self.columns, values[start:start + block_rows], self.keys[start:start + block_rows])
+            for start in range(0, max(len(data), 1), block_rows)
+        ]
+        self.total = reduce(ColumnSketch.merge, self.blocks)
+
+    def sketch(self, data:pd.DataFrame):
+        """Sketch of `data`, a selection of rows and columns of the uploaded frame. Blocks whose rows were all kept reuse their precomputed sketch."""
+        columns = data.select_dtypes('number').columns
+        positions = self.rows.get_indexer(data.index) if self.rows.is_unique else None
+        if positions is None or (positions < 0).any() or not (np.diff(positions) > 0).all():
+            return ColumnSketch.of(columns, data[columns].to_numpy(dtype=float), np.random.default_rng(0).random(len(data)))
+        if len(positions) == len(self.rows):
+            return self.total.select(columns)
+
+        sketches = []
+        bounds = np.searchsorted(positions, np.arange(len(self.blocks) + 1) * self.block_rows)
+        for block, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            if end - start == min(self.block_rows, len(self.rows) - block * self.block_rows):
+                sketches.append(self.blocks[block].select(columns))
+            elif end > start:
+                rows = data.iloc[start:end]
+                sketches.append(ColumnSketch.of(columns, rows[columns].to_numpy(dtype=float), self.keys[positions[start:end]]))
+        if not sketches:
+            return ColumnSketch.of(columns, np.empty((0, len(columns))), np.empty(0))
+        return reduce(ColumnSketch.merge, sketches)
+
+    def describe(self, data:pd.DataFrame):
+        """DataFrame.describe of `data`, from the precomputed block sketches where possible"""
+        if not len(data.select_dtypes('number').columns):
+            return data.describe()
+        return self.sketch(data).describe()
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from chunked import ChunkedFrame, OUT_OF_CORE_BYTES, spool
+from codes import load_codes
+from column_index import DatasetIndex
+from retrieval import BM25Index
+from stats import DatasetStats
+from utils import footprint
+
+# Sessions share the stored frames: with copy-on-write, a shallow copy is a
+# zero-copy view that copies a column only if the session writes to it.
+pd.set_option('mode.copy_on_write', True)
+
+# Parsed uploads and their artifacts kept in memory across all sessions
+MEMORY_BUDGET = 2 * 2**30
+
+
+class Dataset:
+    """A parsed upload and the artifacts derived from it (index, stats), shared read-only by every session that uploads the same file"""
+
+    def __init__(self, data, index=None, stats=None):
+        self.data = data
+        self.index = index
+        self.stats = stats
+        self.data_bytes = footprint(data)
+
+    def view(self):
+        """The data for one session: frames are shallow, copy-on-write copies, so writes never reach the shared one"""
+        return self.data.copy(deep=False) if isinstance(self.data, pd.DataFrame) else self.data
+
+    def nbytes(self):
+        # Indexes grow as columns are first queried, so they are measured each time
+        seen = {id(self.data)}
+        return self.data_bytes + footprint(self.index, seen) + footprint(self.stats, seen)
+
+
+class DatasetStore:
+    """Process-wide store of Datasets keyed by content hash, evicting the least recently used past `budget` bytes"""
+
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.building = {}
+
+    def get(self, key, build):
+        """The Dataset stored under `key`, calling `build()` to make it if there is none. Concurrent sessions uploading the same file build it once."""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            building = self.building.setdefault(key, threading.Lock())
+
+        with building:
+            with self.lock:
+                if key in self.entries:
+                    return self.entries[key]
+            dataset = build()
+            with self.lock:
+                self.entries[key] = dataset
+                self.building.pop(key, None)
+                self._evict()
+        return dataset
+
+    def _evict(self):
+        total = sum(dataset.nbytes() for dataset in self.entries.values())
+        # The newest entry always stays, even if it alone is over budget
+        while total > self.budget and len(self.entries) > 1:
+            _, dataset = self.entries.popitem(last=False)
+            total -= dataset.nbytes()
+
+
+def csv_dataset(uploaded_file):
+    """A CSV upload with its column indexes and statistics. Large uploads stay on disk and are queried in chunks."""
+    if uploaded_file.size > OUT_OF_CORE_BYTES:
+        return Dataset(ChunkedFrame(spool(uploaded_file)))
+    df = pd.read_csv(uploaded_file)
+    return Dataset(df, DatasetIndex(df), DatasetStats(df))
+
+
+def codes_dataset(uploaded_file, key):
+    """An insurance code file with the retrieval index over its rows"""
+    df = load_codes(uploaded_file, key)
+    # The rows are joined into documents only if the index has to be built
+    return Dataset(df, BM25Index.cached(key, lambda: df.astype(str).agg(' '.join, axis=1).tolist()))
+
+
+@st.cache_resource
+def dataset_store():
+    return DatasetStore()
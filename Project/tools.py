@@ -1,33 +1,112 @@
 import json
+from collections import OrderedDict
+
 import pandas as pd
 import streamlit as st
 
+from chunked import UnsupportedQuery, preview
+from plan import Plan, RESULTS
+
 # def get_columns(): 
 #     """Get the columns of the dataset"""
 #     data:pd.DataFrame = st.session_state.data
 #     return json.dumps({'columns': list(data.columns)})
 
+SAMPLE_ROWS = 5
+# Results kept server-side per session for the UI to render
+MAX_RESULTS = 20
+
+
+def store_result(df):
+    """Keeps a result's preview in the session and returns its handle, evicting the oldest results past MAX_RESULTS.
+    The preview is materialized here once, so results on disk are not read again on every rerun."""
+    if 'results' not in st.session_state:
+        st.session_state.results = OrderedDict()
+        st.session_state.result_count = 0
+    st.session_state.result_count += 1
+    handle = f'result-{st.session_state.result_count}'
+    st.session_state.results[handle] = preview(df)
+    while len(st.session_state.results) > MAX_RESULTS:
+        st.session_state.results.popitem(last=False)
+    return handle
+
+def summarize(df):
+    """Bounded summary of a result for the model: handle, shape, schema and a few sample rows"""
+    handle = store_result(df)
+    sample = st.session_state.results[handle].head(SAMPLE_ROWS)
+    return json.dumps({
+        'handle': handle,
+        'shape': list(df.shape) if isinstance(df, pd.DataFrame) else [None, len(df.columns)],
+        'columns': {column: str(dtype) for column, dtype in sample.dtypes.items()},
+        'sample': sample.to_dict(orient='records'),
+    }, default=str)
+
+def render_parsed_response(response):
+    """Renders a parsed tool response, drawing cached results directly instead of from JSON"""
+    if 'handle' in response and response['handle'] in st.session_state.get('results', {}):
+        st.dataframe(st.session_state.results[response['handle']])
+    elif 'data' in response:
+        st.dataframe(response['data'])
+    else:
+        st.json(response)
+
+def render_tool_response(content):
+    render_parsed_response(json.loads(content))
+
+
+def evaluate(plan:Plan):
+    """Result of a plan over the original data, memoized by dataset fingerprint and optimized plan"""
+    original = st.session_state.original_data
+    optimized = plan.optimize(original.columns)
+    key = (st.session_state.data_fingerprint, optimized)
+    df = RESULTS.get(key)
+    if df is None:
+        df = optimized.execute(original, st.session_state.get('data_index'))
+        RESULTS.put(key, df)
+    return df
+
+def apply_plan(plan:Plan):
+    """Makes `plan` the current one, keeping the previous plan for undo. Only plans are kept: their results are evaluated again, usually from RESULTS."""
+    df = evaluate(plan)
+    st.session_state.plan_history.append(st.session_state.plan)
+    st.session_state.plan = plan
+    st.session_state.data = df
+    return df
+
 
 def describe_data():
     """Describes the dataset"""
     data:pd.DataFrame = st.session_state.data
-    return json.dumps({'data': data.describe().to_dict()})
+    key = ('describe', st.session_state.data_fingerprint, st.session_state.plan.optimize(st.session_state.original_data.columns))
+    description = RESULTS.get(key)
+    if description is None:
+        stats = st.session_state.get('data_stats')
+        description = stats.describe(data) if stats is not None else data.describe()
+        RESULTS.put(key, description)
+    return json.dumps({'data': description.to_dict()})
 
 def selection(prompt:str):
     """Query the dataset using a python relational algebra prompt. Equivalent to relational algebra projection. """
-    data:pd.DataFrame = st.session_state.data
-    df = data.query(prompt)
-    st.session_state.data = df
-    return json.dumps({'data': df.to_dict()})
+    try:
+        df = apply_plan(st.session_state.plan.filter(prompt))
+    except UnsupportedQuery as error:
+        return json.dumps({'error': str(error)})
+    return summarize(df)
 
 def projection(columns:list):
     """Select columns from the dataset. Equivalent to relational algebra selection"""
-    data:pd.DataFrame = st.session_state.data
-    df = data.loc[:, columns]
-    st.session_state.data = df
-    return json.dumps({'data': df.to_dict()})
+    df = apply_plan(st.session_state.plan.project(columns))
+    return summarize(df)
 
 def reset_data():
-    st.session_state.data = st.session_state.original_data
-    data:pd.DataFrame = st.session_state.data
-    return json.dumps({'data': data.to_dict()})
\ No newline at end of file
+    df = apply_plan(Plan())
+    return summarize(df)
+
+def undo():
+    """Restores the dataset as it was before the last selection, projection or reset"""
+    if not st.session_state.plan_history:
+        return json.dumps({'error': 'Nothing to undo'})
+    plan = st.session_state.plan_history.pop()
+    st.session_state.data = evaluate(plan)
+    st.session_state.plan = plan
+    return summarize(st.session_state.data)
\ No newline at end of file
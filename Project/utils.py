@@ -1,17 +1,79 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
 import streamlit as st
-from openai import OpenAI, AuthenticationError
+from openai import OpenAI, AuthenticationError, PermissionDeniedError
 
-def validate_openai_key(openai_key):
+# Artifacts derived from uploads persist here across sessions and restarts, named by the upload's content hash
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'csc480-cache')
+
+def content_hash(file):
+    """SHA-256 of an uploaded file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(1 << 20), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+def save_arrays(path, **arrays):
+    """np.savez to `path`, written beside it and renamed so concurrent sessions never read a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix='.npz', delete=False) as f:
+        np.savez(f, **arrays)
+    os.replace(f.name, path)
+
+def footprint(obj, seen=None):
+    """Bytes held by the numpy arrays and frames reachable from `obj`"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, dict):
+        return sum(footprint(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(footprint(value, seen) for value in obj)
+    if hasattr(obj, '__dict__'):
+        return footprint(vars(obj), seen)
+    return 0
+
+# How long a key stays validated before it is checked with the API again
+VALIDATION_TTL = 15 * 60
+
+def key_digest(openai_key):
+    return hashlib.sha256(openai_key.encode()).hexdigest()
+
+# Arguments starting with an underscore are not hashed by Streamlit's caches,
+# so clients and validations are cached by the key's digest, never the key itself.
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _pooled_client(digest, _openai_key):
+    return OpenAI(api_key=_openai_key)
+
+def get_client(openai_key=None):
+    """OpenAI client for a key (by default the session's), shared by every page and session so its connections stay alive"""
+    openai_key = st.session_state.openai_key if openai_key is None else openai_key
+    return _pooled_client(key_digest(openai_key), openai_key)
+
+@st.cache_data(ttl=VALIDATION_TTL, show_spinner=False, max_entries=256)
+def _validate(digest, _openai_key):
     try:
-        client = OpenAI(api_key=openai_key)
-        response = client.chat.completions.create(
-            model=st.session_state.openai_model, 
-            messages=[{'role': 'user', 'content': 'test'}],
-        )
+        _pooled_client(digest, _openai_key).models.list()
+        return True
+    except PermissionDeniedError:
+        # Restricted keys may not list models; the key itself was accepted
         return True
     except AuthenticationError:
         return False
 
+def validate_openai_key(openai_key):
+    return _validate(key_digest(openai_key), openai_key)
+
 def authenticate():
     if 'openai_model' in st.session_state and 'openai_key' in st.session_state:
         if validate_openai_key(st.session_state.openai_key):
@@ -23,18 +85,18 @@ def authenticate():
     else:
         st.stop()
 
-def submit_num_results():
-    st.session_state.messages_icf = [
-        {"role": "system", "content":
-            f'''
-            You will act as an insurance agent that will compare the following insurance codes to a provided input. 
-            Compare the code descriptions and the provided input and output the {st.session_state.num_results} most relevant results.
-            Provided Insurance Codes: 
-            ---
-            {st.session_state.codes.to_string()}
+# Separates a question from the candidate codes retrieved for it in the messages sent to the model
+CANDIDATE_SEPARATOR = '\n---\nCandidate insurance codes:\n'
+
+def code_finder_prompt(num_results):
+    return f'''
+            You will act as an insurance agent that will compare insurance codes to a provided input. 
+            Each input is followed by the candidate insurance codes whose descriptions best match it.
+            Compare the candidate code descriptions and the provided input and output the {num_results} most relevant results.
             '''
-        }
-    ]
+
+def submit_num_results():
+    st.session_state.messages_icf = [{"role": "system", "content": code_finder_prompt(st.session_state.num_results)}]
 
 def submit_system_prompt():
     st.session_state.messages_sp = [{'role': 'system', 'content': st.session_state.system_prompt}]